@@ -6,7 +6,7 @@ Config attributes should already be imported before running the pipe layer
 """
 import sys
 import os
-import copy
+import numpy as np
 import pandas as pd
 
 REPO_NAME = 'sewer-nfl'
@@ -15,7 +15,12 @@ REPO_DIR = CWD[:CWD.find(REPO_NAME)+len(REPO_NAME)]
 sys.path.insert(0,REPO_DIR)
 
 from warehouse.pipelines.game_summary.game_summary import game_outcomes
-from warehouse.catalog import build_catalog
+from warehouse.pipelines.pbp.setup import ingest_week
+from warehouse.catalog import build_catalog, run_feature
+from warehouse.config import Configuration
+from warehouse.utilities.team_tensor import TeamWeekTensor
+
+GAME_KEYS = ['season','week','home_team','away_team']
 
 def build_training_dataset(
         config = None,
@@ -23,7 +28,8 @@ def build_training_dataset(
         cache = True,
         cache_path = 'cache/training_datasets',
         cache_name = 'v1',
-        regenerate = True
+        regenerate = True,
+        trailing_weeks = None
 ):
     '''
 
@@ -31,6 +37,8 @@ def build_training_dataset(
     Inputs:
     - config: Configuration class, unique at model level but containing variables critical for
               FEATURE_CATALOG creation
+    - trailing_weeks: window size or list of sizes overriding config.TRAILING_WEEKS. A list gives
+              every feature once per window, suffixed _<n>w (see catalog.run_feature)
 
     '''
     # Are we reading from cache?
@@ -42,35 +50,32 @@ def build_training_dataset(
 
     gd = game_outcomes(config.pbp_api_data)
     FUNCTION_CATALOG = build_catalog(config)
+    features = FUNCTION_CATALOG.keys() if config.FEATURES is None else config.FEATURES
     catalog_results = [
-    FUNCTION_CATALOG[key]['func']\
-        (*FUNCTION_CATALOG[key]['params']) \
-            for key in FUNCTION_CATALOG.keys()
+        result
+            for key in features
+                for result in run_feature(FUNCTION_CATALOG[key], trailing_weeks)
     ]
-    # Iterate over results and build final df
-    df = catalog_results[0]
-    for i in range(1,len(catalog_results)):
-        on_cols = ['season','week','team']
-        left_on = [oc for oc in on_cols if oc in df.columns]
-        right_on = [oc for oc in on_cols if oc in catalog_results[i].columns]
-        # If right missing left, reduce
-        if len(right_on) < len(left_on):
-            left_on = copy.deepcopy(right_on)
-        if 'defteam' in catalog_results[i].columns:
-            left_on.append('team')
-            right_on.append('defteam')
-        df = df.merge(catalog_results[i], how = "left", left_on = left_on, right_on = right_on)
-
-    t_cols = [c for c in df.columns if c not in gd.columns]
+    # One season x week x team x feature array. Rows follow the first feature, as the left joins
+    # onto it did
+    tensor = TeamWeekTensor.from_frames(catalog_results)
+
+    # Games in week w are paired with features through week w - 1, a one week slice
+    previous = tensor.shifted(1)
     res = gd
-    res['week'] = res['week'] -1
-    for side in ['home','away']:
-        res = res.merge(df,
-                how = "left",
-                left_on = ['season','week',f'{side}_team'],
-                right_on = ['season','week','team'])
-        r_dict = {key:f'{side}_{key}' for key in t_cols if f'{side}_{key}' not in gd.columns}
-        res.rename(columns = r_dict, inplace=True)
+    for side, suffix in [('home','x'), ('away','y')]:
+        values, present = previous.gather(res['season'], res['week'], res[f'{side}_team'])
+        found = present[:, 0]
+        columns = {'team': res[f'{side}_team'].where(found)}
+        columns.update({
+            feature: np.where(found, values[:, i], np.nan) for i, feature in enumerate(tensor.features)
+        })
+        # Prefixed with the side, unless that clashes with a game column
+        res = res.assign(**{
+            f'{side}_{k}' if f'{side}_{k}' not in gd.columns else f'{k}_{suffix}': v
+            for k, v in columns.items()
+        })
+    res['week'] = res['week'] - 1
 
     # Add filter
     res['missing_N'] = res.isnull().sum(axis=1) / len(res.columns)
@@ -80,3 +85,54 @@ def build_training_dataset(
 
     return res
 
+def update_training_dataset(
+        season,
+        week,
+        config = None,
+        ingest = True,
+        auto_filter = .25,
+        cache_path = 'cache/training_datasets',
+        cache_name = 'v1'
+):
+    '''
+
+    Incremental (in-season) refresh of a cached training dataset after week `week` of `season`
+    has been played:
+    - appends only that week to the local pbp store (skip with ingest = False)
+    - rebuilds features only for the teams playing that week, from their games of that season up
+      to that week. Every trailing window is computed within a (season, team) group, so other
+      seasons and teams cannot change, and later weeks are left out
+    - upserts the week's games (paired with the week - 1 features, as in build_training_dataset)
+      into the cached csv
+    Inputs:
+    - config: Configuration spanning only `season`, built offline from the store and limited to
+              the week's teams when None
+
+    '''
+    if ingest:
+        ingest_week(season, week)
+    if config is None:
+        schedule = Configuration(starting_year = season, ending_year = season, offline = True)\
+            .schedule
+        playing = schedule[schedule['week']==week]
+        config = Configuration(
+            starting_year = season,
+            ending_year = season,
+            offline = True,
+            teams = sorted(set(playing['posteam'].dropna()) | set(playing['defteam'].dropna())),
+            max_week = week
+        )
+
+    res = build_training_dataset(config = config, auto_filter = auto_filter, cache = False)
+    # Training rows carry the feature week, one behind the week the game was played
+    res = res[(res['season']==season) & (res['week']==week - 1)]
+
+    cache_file = f'{REPO_DIR}/{cache_path}/{cache_name}.csv'
+    if os.path.exists(cache_file):
+        cached = pd.read_csv(cache_file, index_col = 0)
+        stale = cached.set_index(GAME_KEYS).index.isin(res.set_index(GAME_KEYS).index)
+        res = pd.concat([cached[~stale], res], ignore_index = True)
+    res = res.sort_values(GAME_KEYS).reset_index(drop = True)
+    res.to_csv(cache_file)
+
+    return res
@@ -1,194 +1,334 @@
-"""Module Docstring"""
+"""
+Positional ELO model No.1 data pipeline.
+
+Receiving, rushing and passing each run an independent pre_elo_epa -> calculate_elo_metric
+chain (CHAINS), aggregated to one row per team-week and joined onto the games at the end.
+run_pipeline fans the three chains out to a process pool. The play by play columns they read
+and the player dimension are written once as .npy files (string columns as categorical codes)
+and every worker memory maps them (share_frame / load_shared) instead of receiving a pickled
+copy of the frames.
+
+Example:
+
+python models/pe1/pipeline.py
+
+pbp_api_data, roster_api_data = load_data()
+model_df = run_pipeline(pbp_api_data, roster_api_data)
+
+"""
 import sys
 import os
+import json
+import tempfile
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
 
 REPO_NAME = 'sewer-nfl'
 CWD = str(os.getcwd())
 REPO_DIR = CWD[:CWD.find(REPO_NAME)+len(REPO_NAME)]
 sys.path.insert(0,REPO_DIR)
+import numpy as np
 import pandas as pd
-import nfl_data_py as nflreadr
-from warehouse.pipelines.pbp.performance import pre_elo_epa, META_COLUMNS
+from warehouse.pipelines.pbp.setup import load_pbp, load_roster
+from warehouse.pipelines.pbp.performance import pre_elo_epa, META_COLUMNS, BASE_DATA_COLS
+from warehouse.pipelines.pbp.players import player_dimension
 from warehouse.utilities.elo import calculate_elo_metric
 
 MIN_YEAR = 2010
 MAX_YEAR = 2022
 MAX_WEEK = 18
 
-pbp_api_data = nflreadr.import_pbp_data(range(MIN_YEAR,MAX_YEAR + 1))
-pbp_api_data = pbp_api_data[pbp_api_data['week']<=MAX_WEEK]
-
-roster_api_data = nflreadr.import_rosters(years=range(MIN_YEAR, MAX_YEAR + 1))
-
-# Receiving
-
-receiving_off_epa , receiving_def_epa = pre_elo_epa(
-    pbp_api = pbp_api_data,
-    roster_api = roster_api_data,
-    position_filter = ['RB','WR','TE'],
-    play_types = ['pass'],
-    player_id_col = 'receiver_player_id',
-    order_cols = ['season','week'],
-    # At what level are we AGGREGATING offensive performance
-    off_gb_cols = ['posteam','defteam','position','player_name'],
-    # What is aggregate level for z score
-    gb_cols_z = ['season','position'],
-    # Matched up against what level on defense to AGGREGATE to
-    def_gb_cols = ['posteam','defteam','position'],
-    # What are we assessing for ELO
-    perf_cols = ['epa'],
-    off_appearance_columns = ['position','receiver_player_id','season'],
-    def_appearance_columns = ['position','defteam','season']
-)
-receiving_elo_df = calculate_elo_metric(
-    input_off_data = receiving_off_epa,
-    input_def_data = receiving_def_epa,
-    order_cols = ['season','week'],
-    off_gb_cols = ['posteam','defteam','position','player_name'],
-    # At what level are we AGGREGATING offensive performance
-    def_gb_cols = ['posteam','defteam','position'],
-    # Matched up against what level on defense to AGGREGATE to
-    off_lookup_values = ['position','receiver_player_id'],
-    def_lookup_values = ['position','defteam'],
-    off_perf_col = 'z_epa_x',
-    def_perf_col = 'z_epa_y',
-    elo_multiplier = 5,
-    elo_power = 1.7,
-    elo_base = 2000
-)
-
-# Rushing
-
-rushing_off_epa , rushing_def_epa = pre_elo_epa(
-    pbp_api = pbp_api_data,
-    roster_api = roster_api_data,
-    position_filter = ['QB','RB'],
-    play_types = ['run'],
-    player_id_col = 'rusher_player_id',
-    order_cols = ['season','week'],
-    off_gb_cols = ['posteam','defteam','position','player_name'],
-    # At what level are we AGGREGATING offensive performance
-    gb_cols_z = ['season','position'],
-    # What is aggregate level for z score
-    def_gb_cols = ['posteam','defteam','position'],
-    # Matched up against what level on defense to AGGREGATE to
-    perf_cols = ['epa'],
-    # What are we assessing for ELO
-    off_appearance_columns = ['position','rusher_player_id','season'],
-    def_appearance_columns = ['position','defteam','season']
-)
-rushing_elo_df = calculate_elo_metric(
-    input_off_data = rushing_off_epa,
-    input_def_data = rushing_def_epa,
-    order_cols = ['season','week'],
-    off_gb_cols = ['posteam','defteam','position','player_name'],
-    # At what level are we AGGREGATING offensive performance
-    def_gb_cols = ['posteam','defteam','position'],
-    # Matched up against what level on defense to AGGREGATE to
-    off_lookup_values = ['position','rusher_player_id'],
-    def_lookup_values = ['position','defteam'],
-    off_perf_col = 'z_epa_x',
-    def_perf_col = 'z_epa_y',
-    elo_multiplier = 5,
-    elo_power = 1.7,
-    elo_base = 2000
-)
-
-# Passing
-
-passing_off_epa , passing_def_epa = pre_elo_epa(
-    pbp_api = pbp_api_data,
-    roster_api = roster_api_data,
-    position_filter = ['QB'],
-    play_types = ['pass'],
-    player_id_col = 'passer_player_id',
-    order_cols = ['season','week'],
-    # At what level are we AGGREGATING offensive performance
-    off_gb_cols = ['posteam','defteam','position','player_name'],
-    gb_cols_z = ['season','position'], # What is aggregate level for z score
-    def_gb_cols = ['posteam','defteam','position'],
-    perf_cols = ['epa'], # What are we assessing for ELO
-    off_appearance_columns = ['position','passer_player_id','season'],
-    def_appearance_columns = ['position','defteam','season']
-)
-passing_elo_df = calculate_elo_metric(
-    input_off_data = passing_off_epa,
-    input_def_data = passing_def_epa,
-    order_cols = ['season','week'],
-    # At what level are we AGGREGATING offensive performance
-    off_gb_cols = ['posteam','defteam','position','player_name'],
-    # Matched up against what level on defense to AGGREGATE to
-    def_gb_cols = ['posteam','defteam','position'],
-    off_lookup_values = ['position','passer_player_id'],
-    def_lookup_values = ['position','defteam'],
-    off_perf_col = 'z_epa_x',
-    def_perf_col = 'z_epa_y',
-    elo_multiplier = 5,
-    elo_power = 1.7,
-    elo_base = 2000
-)
-
-# Aggregate final DFs to model level
-agg_passing = passing_elo_df.groupby(['season','week','posteam','defteam','position'])\
-    .head(1).groupby(['season','week','posteam','defteam','position'])[['off_elo','def_elo']]\
-        .mean().reset_index()
-df = pd.pivot_table(
-    agg_passing,
-    values = ['off_elo','def_elo'],
-    columns = 'position',
-    index = ['season','week','posteam','defteam']
-).reset_index()
-df.columns = [x[0] if x[1]=='' else f'{x[0]}_{x[1]}_pass' for x in df.columns]
-agg_passing = df
-agg_rushing = rushing_elo_df.groupby(['season','week','posteam','defteam','position'])\
-    .head(2).groupby(['season','week','posteam','defteam','position'])[['off_elo','def_elo']]\
-        .mean().reset_index()
-df = pd.pivot_table(
-    agg_rushing,
-    values = ['off_elo','def_elo'],
-    columns = 'position',
-    index = ['season','week','posteam','defteam']
-).reset_index()
-df.columns = [x[0] if x[1]=='' else f'{x[0]}_{x[1]}_rush' for x in df.columns]
-agg_rushing = df
-agg_receiving = receiving_elo_df.groupby(['season','week','posteam','defteam','position'])\
-    .head(3).groupby(['season','week','posteam','defteam','position'])[['off_elo','def_elo']]\
-        .mean().reset_index()
-df = pd.pivot_table(
-    agg_receiving,
-    values = ['off_elo','def_elo'],
-    columns = 'position',
-    index = ['season','week','posteam','defteam']
-).reset_index()
-df.columns = [x[0] if x[1]=='' else f'{x[0]}_{x[1]}_rec' for x in df.columns]
-agg_receiving = df
-
-game_data = pbp_api_data[META_COLUMNS].drop('posteam',axis = 1).drop_duplicates()
-
-all_elo = agg_passing.merge(
-    agg_receiving,
-    on = ['season','week','posteam','defteam'],
-    how = 'left'
-).merge(
-    agg_rushing,
-    on = ['season','week','posteam','defteam'],
-    how = 'left'
-)
-
-temp_df = pd.concat([game_data.merge(
-    all_elo,
-    how = 'left',
-    left_on = ['season','week','home_team','away_team'],
-    right_on = ['season','week','posteam','defteam']
-),
-game_data.merge(
-    all_elo,
-    how = 'left',
-    left_on = ['season','week','away_team','home_team'],
-    right_on = ['season','week','posteam','defteam']
-)]).sort_values(['season','week','home_team'])
-
-model_df = temp_df[temp_df['posteam']==temp_df['home_team']].merge(
-    temp_df[temp_df['posteam']==temp_df['away_team']],
-    on = ['game_id','old_game_id','season','week','home_team','away_team','spread_line']
-)
+GAME_KEYS = ['season','week','posteam','defteam']
+
+# Per chain: pre_elo_epa and calculate_elo_metric arguments, players kept per team-week and
+# position (top) and the suffix of its columns
+CHAINS = {
+    'receiving': {
+        'pre_elo': dict(
+            position_filter = ['RB','WR','TE'],
+            play_types = ['pass'],
+            player_id_col = 'receiver_player_id',
+            order_cols = ['season','week'],
+            # At what level are we AGGREGATING offensive performance
+            off_gb_cols = ['posteam','defteam','position','player_name'],
+            # What is aggregate level for z score
+            gb_cols_z = ['season','position'],
+            # Matched up against what level on defense to AGGREGATE to
+            def_gb_cols = ['posteam','defteam','position'],
+            # What are we assessing for ELO
+            perf_cols = ['epa'],
+            off_appearance_columns = ['position','receiver_player_id','season'],
+            def_appearance_columns = ['position','defteam','season']
+        ),
+        'elo': dict(
+            order_cols = ['season','week'],
+            off_gb_cols = ['posteam','defteam','position','player_name'],
+            def_gb_cols = ['posteam','defteam','position'],
+            off_lookup_values = ['position','receiver_player_id'],
+            def_lookup_values = ['position','defteam'],
+            off_perf_col = 'z_epa_x',
+            def_perf_col = 'z_epa_y',
+            elo_multiplier = 5,
+            elo_power = 1.7,
+            elo_base = 2000
+        ),
+        'top': 3,
+        'suffix': 'rec'
+    },
+    'rushing': {
+        'pre_elo': dict(
+            position_filter = ['QB','RB'],
+            play_types = ['run'],
+            player_id_col = 'rusher_player_id',
+            order_cols = ['season','week'],
+            off_gb_cols = ['posteam','defteam','position','player_name'],
+            gb_cols_z = ['season','position'],
+            def_gb_cols = ['posteam','defteam','position'],
+            perf_cols = ['epa'],
+            off_appearance_columns = ['position','rusher_player_id','season'],
+            def_appearance_columns = ['position','defteam','season']
+        ),
+        'elo': dict(
+            order_cols = ['season','week'],
+            off_gb_cols = ['posteam','defteam','position','player_name'],
+            def_gb_cols = ['posteam','defteam','position'],
+            off_lookup_values = ['position','rusher_player_id'],
+            def_lookup_values = ['position','defteam'],
+            off_perf_col = 'z_epa_x',
+            def_perf_col = 'z_epa_y',
+            elo_multiplier = 5,
+            elo_power = 1.7,
+            elo_base = 2000
+        ),
+        'top': 2,
+        'suffix': 'rush'
+    },
+    'passing': {
+        'pre_elo': dict(
+            position_filter = ['QB'],
+            play_types = ['pass'],
+            player_id_col = 'passer_player_id',
+            order_cols = ['season','week'],
+            off_gb_cols = ['posteam','defteam','position','player_name'],
+            gb_cols_z = ['season','position'],
+            def_gb_cols = ['posteam','defteam','position'],
+            perf_cols = ['epa'],
+            off_appearance_columns = ['position','passer_player_id','season'],
+            def_appearance_columns = ['position','defteam','season']
+        ),
+        'elo': dict(
+            order_cols = ['season','week'],
+            off_gb_cols = ['posteam','defteam','position','player_name'],
+            def_gb_cols = ['posteam','defteam','position'],
+            off_lookup_values = ['position','passer_player_id'],
+            def_lookup_values = ['position','defteam'],
+            off_perf_col = 'z_epa_x',
+            def_perf_col = 'z_epa_y',
+            elo_multiplier = 5,
+            elo_power = 1.7,
+            elo_base = 2000
+        ),
+        'top': 1,
+        'suffix': 'pass'
+    }
+}
+
+def chain_columns(chains = CHAINS):
+    '''
+    pbp columns read by the chains
+    '''
+    ids = [chain['pre_elo']['player_id_col'] for chain in chains.values()]
+    return list(dict.fromkeys(BASE_DATA_COLS + META_COLUMNS + ids))
+
+def share_frame(data, directory):
+    '''
+    Write the columns of data to directory as .npy files that load_shared memory maps: numeric
+    columns as they are, nullable integers as values and mask, strings and categoricals as
+    category codes with the (sorted) categories in columns.json
+    '''
+    os.makedirs(directory, exist_ok = True)
+    layout = {}
+    for i, col in enumerate(data.columns):
+        values = data[col]
+        if pd.api.types.is_extension_array_dtype(values) and \
+                pd.api.types.is_integer_dtype(values):
+            np.save(f'{directory}/{i}.npy',
+                    values.fillna(0).to_numpy(dtype = values.dtype.numpy_dtype))
+            np.save(f'{directory}/{i}_mask.npy', values.isna().to_numpy())
+            layout[col] = {'file': i, 'kind': 'masked'}
+        elif pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            np.save(f'{directory}/{i}.npy', values.to_numpy())
+            layout[col] = {'file': i, 'kind': 'numeric'}
+        else:
+            # Categoricals keep their categories, strings get sorted ones so groupby orders match
+            values = values.astype('category')
+            np.save(f'{directory}/{i}.npy', values.cat.codes.to_numpy())
+            layout[col] = {
+                'file': i,
+                'kind': 'codes',
+                'categories': values.cat.categories.tolist()
+            }
+
+    with open(f'{directory}/columns.json', 'w') as f:
+        json.dump(layout, f)
+
+def load_shared(directory, columns = None):
+    '''
+    Frame written by share_frame over the memory mapped files, code columns as categoricals
+    (NaN where missing) on the mapped codes. Nothing is copied until a column is modified
+    '''
+    with open(f'{directory}/columns.json') as f:
+        layout = json.load(f)
+
+    data = {}
+    for col in layout if columns is None else columns:
+        spec = layout[col]
+        values = np.load(f'{directory}/{spec["file"]}.npy', mmap_mode = 'r')
+        if spec['kind'] == 'masked':
+            mask = np.load(f'{directory}/{spec["file"]}_mask.npy', mmap_mode = 'r')
+            data[col] = pd.arrays.IntegerArray(np.asarray(values), np.asarray(mask))
+        elif spec['kind'] == 'codes':
+            data[col] = pd.Categorical.from_codes(values, categories = spec['categories'])
+        else:
+            data[col] = values
+
+    # The default copies (and consolidates) the columns
+    return pd.DataFrame(data, copy = False)
+
+def aggregate_chain(elo_df, top, suffix):
+    '''
+    Mean off / def ELO of the first `top` players per team-week and position, one column per
+    position (off_elo_<position>_<suffix>, def_elo_<position>_<suffix>)
+    '''
+    agg = elo_df.groupby(GAME_KEYS + ['position'], observed = True)\
+        .head(top).groupby(GAME_KEYS + ['position'], observed = True)[['off_elo','def_elo']]\
+            .mean().reset_index()
+    df = pd.pivot_table(
+        agg,
+        values = ['off_elo','def_elo'],
+        columns = 'position',
+        index = GAME_KEYS,
+        observed = True
+    ).reset_index()
+    df.columns = [x[0] if x[1]=='' else f'{x[0]}_{x[1]}_{suffix}' for x in df.columns]
+    return df
+
+def run_chain(name, shared_dir):
+    '''
+    One chain of CHAINS over the shared play by play data and player dimension, aggregated per
+    team-week
+    '''
+    chain = CHAINS[name]
+    pbp_api_data = load_shared(f'{shared_dir}/pbp')
+    players = load_shared(f'{shared_dir}/players').set_index(['player_id','season'])
+
+    off_epa, def_epa = pre_elo_epa(
+        pbp_api = pbp_api_data,
+        players = players,
+        **chain['pre_elo']
+    )
+    elo_df = calculate_elo_metric(
+        input_off_data = off_epa,
+        input_def_data = def_epa,
+        **chain['elo']
+    )
+    return aggregate_chain(elo_df, chain['top'], chain['suffix'])
+
+def join_games(game_data, agg_passing, agg_receiving, agg_rushing):
+    '''
+    Home and away team ELO aggregates side by side, one row per game
+    '''
+    all_elo = agg_passing.merge(
+        agg_receiving,
+        on = GAME_KEYS,
+        how = 'left'
+    ).merge(
+        agg_rushing,
+        on = GAME_KEYS,
+        how = 'left'
+    )
+
+    temp_df = pd.concat([game_data.merge(
+        all_elo,
+        how = 'left',
+        left_on = ['season','week','home_team','away_team'],
+        right_on = GAME_KEYS
+    ),
+    game_data.merge(
+        all_elo,
+        how = 'left',
+        left_on = ['season','week','away_team','home_team'],
+        right_on = GAME_KEYS
+    )]).sort_values(['season','week','home_team'])
+
+    return temp_df[temp_df['posteam']==temp_df['home_team']].merge(
+        temp_df[temp_df['posteam']==temp_df['away_team']],
+        on = ['game_id','old_game_id','season','week','home_team','away_team','spread_line']
+    )
+
+def run_pipeline(
+        pbp_api_data,
+        roster_api_data,
+        max_workers = len(CHAINS),
+        shared_dir = None
+):
+    '''
+    Model frame of pe1: the chains run in parallel worker processes over a memory mapped copy of
+    the pbp columns they need and of the player dimension (in shared_dir, a temporary directory
+    by default)
+    '''
+    directory = tempfile.TemporaryDirectory() if shared_dir is None else nullcontext(shared_dir)
+    with directory as shared_dir:
+        share_frame(pbp_api_data[chain_columns()], f'{shared_dir}/pbp')
+        share_frame(player_dimension(roster_api_data).reset_index(), f'{shared_dir}/players')
+
+        with ProcessPoolExecutor(max_workers = max_workers) as pool:
+            futures = {name: pool.submit(run_chain, name, shared_dir) for name in CHAINS}
+            aggregates = {name: future.result() for name, future in futures.items()}
+
+    game_data = pbp_api_data[META_COLUMNS].drop('posteam',axis = 1).drop_duplicates()
+
+    return join_games(
+        game_data,
+        aggregates['passing'],
+        aggregates['receiving'],
+        aggregates['rushing']
+    )
+
+def load_data(min_year = MIN_YEAR, max_year = MAX_YEAR, max_week = MAX_WEEK, offline = False):
+    '''
+    Play by play (the chain columns, weeks up to max_week) and rosters of the model seasons,
+    read through the local store (see setup.py) with int32 player keys. offline = True never
+    touches the API
+    '''
+    pbp_api_data = load_pbp(
+        starting_year = min_year,
+        ending_year = max_year,
+        offline = offline,
+        columns = chain_columns()
+    )
+    pbp_api_data = pbp_api_data[pbp_api_data['week']<=max_week]
+
+    roster_api_data = load_roster(
+        starting_year = min_year,
+        ending_year = max_year,
+        offline = offline
+    )
+
+    return pbp_api_data, roster_api_data
+
+def __getattr__(name):
+    # `from pe1.pipeline import model_df, pbp_api_data` runs the pipeline on first access rather
+    # than on import, which the pool's worker processes also do
+    if name not in ['pbp_api_data','roster_api_data','model_df']:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    if 'pbp_api_data' not in globals():
+        globals()['pbp_api_data'], globals()['roster_api_data'] = load_data()
+    if name == 'model_df':
+        globals()['model_df'] = run_pipeline(pbp_api_data, roster_api_data)
+    return globals()[name]
+
+if __name__ == '__main__':
+
+    pbp_api_data, roster_api_data = load_data()
+    model_df = run_pipeline(pbp_api_data, roster_api_data)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The warehouse and models packages are imported from the repo root, wherever it is checked out
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
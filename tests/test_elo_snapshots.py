@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from warehouse.utilities.elo import calculate_elo_metric
+from warehouse.utilities.elo_snapshots import update_elo, snapshots
+
+ELO_COLUMNS = ['off_elo','def_elo','off_elo_next','def_elo_next']
+TEAMS = ['ARI','ATL','BAL','BUF']
+
+@pytest.fixture
+def pre_elo():
+    '''
+    Made up pre_elo_epa offense / defense rows: two seasons of round robin games with two
+    rushers per team and a defense row per game side, appearance counts per season
+    '''
+    rng = np.random.default_rng(0)
+    games = [
+        (season, week, posteam, defteam)
+        for season in [2021, 2022] for week in range(1, 7)
+        for home, away in [(TEAMS[(week + i) % 4], TEAMS[(week + i + 1 + week % 2) % 4])
+                           for i in [0, 2]] if home != away
+        for posteam, defteam in [(home, away), (away, home)]
+    ]
+    games = pd.DataFrame(games, columns = ['season','week','posteam','defteam'])\
+        .drop_duplicates(['season','week','posteam']).assign(position = 'RB')
+
+    off = pd.concat([games.assign(rusher_player_id = games['posteam'] + str(i)) for i in [1, 2]])
+    off['player_name'] = off['rusher_player_id']
+    off['z_epa'] = rng.normal(size = len(off))
+    off = off.sort_values(['season','week']).reset_index(drop = True)
+    off['off_appearance'] = off.groupby(['position','rusher_player_id','season']).cumcount() + 1
+
+    defense = games.assign(z_epa = rng.normal(size = len(games)))\
+        .sort_values(['season','week']).reset_index(drop = True)
+    defense['def_appearance'] = defense.groupby(['position','defteam','season']).cumcount() + 1
+
+    return off, defense
+
+def test_update_elo_week_by_week_matches_calculate_elo_metric(tmp_path, pre_elo):
+    off, defense = pre_elo
+    full = calculate_elo_metric(off, defense)
+
+    weeks = sorted(set(zip(off['season'], off['week'])))
+    in_week = lambda f, key: f[(f['season'] == key[0]) & (f['week'] == key[1])]
+    chained = pd.concat([
+        update_elo(in_week(off, key), in_week(defense, key), str(tmp_path)) for key in weeks
+    ])
+
+    assert snapshots(str(tmp_path)) == weeks
+    np.testing.assert_array_equal(chained[ELO_COLUMNS].to_numpy(), full[ELO_COLUMNS].to_numpy())
+
+def test_update_elo_resumes_from_an_earlier_snapshot(tmp_path, pre_elo):
+    off, defense = pre_elo
+    full = calculate_elo_metric(off, defense)
+    update_elo(off, defense, str(tmp_path))
+
+    later = lambda f: f[f['season'] == 2022]
+    resumed = update_elo(later(off), later(defense), str(tmp_path), from_snapshot = (2021, 6))
+
+    np.testing.assert_array_equal(
+        resumed[ELO_COLUMNS].to_numpy(),
+        full.loc[full['season'] == 2022, ELO_COLUMNS].to_numpy()
+    )
+
+def test_update_elo_rejects_other_parameters(tmp_path, pre_elo):
+    off, defense = pre_elo
+    early = lambda f: f[f['season'] == 2021]
+    update_elo(early(off), early(defense), str(tmp_path))
+
+    later = lambda f: f[f['season'] == 2022]
+    with pytest.raises(ValueError):
+        update_elo(later(off), later(defense), str(tmp_path), elo_power = 1.5)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from warehouse.utilities.feature_cache import FeatureCache, fingerprint, register_fingerprint, \
+    hash_frame
+
+@pytest.fixture
+def plays():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'season': 2022,
+        'posteam': rng.choice(['ARI','ATL','BAL'], 5000),
+        'epa': rng.normal(size = 5000)
+    })
+
+def test_registered_fingerprint_is_reused(plays):
+    register_fingerprint(plays, 'stored')
+    assert fingerprint(plays) == 'stored'
+
+@pytest.mark.parametrize('edit', [
+    lambda f: f.__setitem__('epa', f['epa'] * 2),
+    lambda f: f.loc.__setitem__((slice(None), 'epa'), 0.0),
+    lambda f: f['epa'].to_numpy().__setitem__(slice(None), 1.0),
+    lambda f: f.__setitem__('yards', 1.0)
+])
+def test_in_place_edits_rehash(plays, edit):
+    register_fingerprint(plays, 'stored')
+    edit(plays)
+    assert fingerprint(plays) == hash_frame(plays)
+
+def test_memoize_recomputes_after_in_place_edit(plays):
+    cache = FeatureCache()
+
+    @cache.memoize()
+    def total_epa(api_data):
+        return api_data['epa'].sum()
+
+    before = total_epa(plays)
+    plays['epa'] += 1
+    assert total_epa(plays) == pytest.approx(before + len(plays))
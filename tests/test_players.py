@@ -0,0 +1,24 @@
+import pandas as pd
+from warehouse.pipelines.pbp import setup
+from warehouse.pipelines.pbp.players import PlayerIds, player_ids_path
+from warehouse.pipelines.pbp.store import PartitionedStore
+from warehouse.utilities.feature_cache import fingerprint
+
+def test_loaded_fingerprint_follows_the_player_dictionary(tmp_path):
+    store_dir = str(tmp_path)
+    roster = pd.DataFrame({
+        'season': 2021,
+        'player_id': ['00-01','00-02','00-03'],
+        'player_name': ['A','B','C']
+    })
+    PartitionedStore('rosters', store_dir, weekly = False).write(roster, seasons = [2021])
+
+    first = setup.load_roster(2021, 2021, store_dir = store_dir, offline = True)
+    again = setup.load_roster(2021, 2021, store_dir = store_dir, offline = True)
+    assert fingerprint(first) == fingerprint(again)
+
+    # Same stored partitions, keys from a rebuilt dictionary
+    PlayerIds(['00-03','00-02','00-01']).save(player_ids_path(store_dir))
+    rebuilt = setup.load_roster(2021, 2021, store_dir = store_dir, offline = True)
+    assert list(rebuilt['player_id']) != list(first['player_id'])
+    assert fingerprint(rebuilt) != fingerprint(first)
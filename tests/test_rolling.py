@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from warehouse.utilities.rolling import PrefixSums, HalfLife, Weekly, ewma_window, ewma_update, \
+    rolling_window, rolling_windows
+
+COLUMNS = ['epa','yards']
+
+@pytest.fixture
+def team_weeks():
+    '''
+    Two seasons of made up team-week values sorted by season, team, week, with NaNs and a bye
+    '''
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame([
+        (season, team, week)
+        for season in [2021, 2022] for team in ['ARI','ATL','BAL'] for week in range(1, 12)
+        if not (team == 'ATL' and week == 6)
+    ], columns = ['season','team','week'])
+    for col in COLUMNS:
+        frame[col] = rng.normal(size = len(frame))
+        frame.loc[rng.random(len(frame)) < 0.1, col] = np.nan
+    return frame
+
+@pytest.mark.parametrize('n', [1, 3, 5])
+@pytest.mark.parametrize('how', ['mean','sum'])
+def test_prefix_sums_match_pandas_rolling(team_weeks, n, how):
+    team_weeks.loc[[3, 25], 'epa'] = [np.inf, -np.inf]
+    team_weeks.loc[40, 'yards'] = np.inf
+
+    expected = getattr(team_weeks.groupby(['season','team'])[COLUMNS].rolling(n), how)()\
+        .reset_index(level = [0, 1], drop = True)
+
+    result = PrefixSums(team_weeks, COLUMNS).window(n, how)
+
+    pd.testing.assert_frame_equal(result, expected.loc[result.index], rtol = 1e-12)
+
+def test_rolling_windows_match_rolling_window(team_weeks):
+    windows = [3, HalfLife(2), 5, Weekly()]
+
+    results = rolling_windows(team_weeks, COLUMNS, windows)
+
+    for window, result in zip(windows, results):
+        pd.testing.assert_frame_equal(result, rolling_window(team_weeks, COLUMNS, window))
+
+@pytest.mark.parametrize('half_life', [1, 2.5, 6])
+def test_ewma_window_matches_pandas(team_weeks, half_life):
+    expected = team_weeks.groupby(['season','team'])[COLUMNS]\
+        .ewm(halflife = half_life, adjust = False, ignore_na = True).mean()\
+        .reset_index(level = [0, 1], drop = True)
+
+    result = ewma_window(team_weeks, COLUMNS, HalfLife(half_life))
+
+    pd.testing.assert_frame_equal(result, expected.loc[result.index])
+
+@pytest.mark.parametrize('how', ['mean','sum'])
+def test_ewma_update_over_last_week_matches_ewma_window(team_weeks, how):
+    half_life = HalfLife(3)
+    last = team_weeks['week'] == team_weeks['week'].max()
+    history = team_weeks[~last].reset_index(drop = True)
+
+    previous = history.assign(**ewma_window(history, COLUMNS, half_life, how))\
+        .groupby(['season','team']).tail(1)
+    updated = ewma_update(previous, team_weeks[last], COLUMNS, half_life, how)
+
+    expected = ewma_window(team_weeks, COLUMNS, half_life, how)[last]
+    np.testing.assert_allclose(updated[COLUMNS].to_numpy(), expected.to_numpy())
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+from warehouse.pipelines.pbp import setup
+from warehouse.pipelines.pbp.store import PartitionedStore, current_season
+
+PAST_SEASON = current_season() - 2
+
+def season_frame(season, value = 0.0, weeks = range(0, 19)):
+    '''
+    Two rows per week of a made up season table
+    '''
+    return pd.DataFrame({
+        'season': season,
+        'week': [w for w in weeks for _ in range(2)],
+        'value': value
+    })
+
+@pytest.fixture
+def api(monkeypatch):
+    '''
+    nfl_data_py stand-in serving season_frame(season, value) with value settable by the test
+    '''
+    served = {'value': 0.0, 'calls': []}
+
+    def import_pbp_data(years):
+        served['calls'].append(('pbp', list(years)))
+        return pd.concat([season_frame(s, served['value'], range(1, 19)) for s in years])
+
+    def import_ngs_data(stat_type, years):
+        served['calls'].append((stat_type, list(years)))
+        return pd.concat([season_frame(s, served['value']) for s in years])
+
+    monkeypatch.setattr(setup.nflreadr, 'import_pbp_data', import_pbp_data)
+    monkeypatch.setattr(setup.nflreadr, 'import_ngs_data', import_ngs_data)
+    return served
+
+def test_write_marks_seasons_complete_once_over(tmp_path):
+    store = PartitionedStore('pbp', str(tmp_path))
+    store.write(season_frame(PAST_SEASON), seasons = [PAST_SEASON])
+    store.write(season_frame(current_season()), seasons = [current_season()])
+
+    assert store.missing_seasons([PAST_SEASON, current_season()]) == [current_season()]
+
+def test_write_keeps_complete_partitions_unless_replaced(tmp_path):
+    store = PartitionedStore('pbp', str(tmp_path))
+    store.write(season_frame(PAST_SEASON, 1.0), seasons = [PAST_SEASON])
+    written = store.write(season_frame(PAST_SEASON, 2.0), seasons = [PAST_SEASON],
+                          replace = [(PAST_SEASON, 5)])
+
+    assert written == [(PAST_SEASON, 5)]
+    data = store.read([PAST_SEASON])
+    assert (data.loc[data['week']==5, 'value'] == 2.0).all()
+    assert (data.loc[data['week']!=5, 'value'] == 1.0).all()
+
+def test_ingest_week_on_empty_store_stores_whole_season(tmp_path, api):
+    setup.ingest_week(PAST_SEASON, 5, store_dir = str(tmp_path))
+
+    for table in ['pbp'] + [f'ngs_{pt}' for pt in setup.NGS_TYPES]:
+        store = PartitionedStore(table, str(tmp_path))
+        assert store.missing_seasons([PAST_SEASON]) == []
+        assert store.read([PAST_SEASON])['week'].nunique() == (18 if table == 'pbp' else 19)
+
+    # The season is complete on disk, loading it does not go back to the API
+    calls = len(api['calls'])
+    PartitionedStore('pbp', str(tmp_path)).load(
+        [PAST_SEASON], fetch = setup.nflreadr.import_pbp_data
+    )
+    assert len(api['calls']) == calls
+
+def test_ingest_week_replaces_only_that_week(tmp_path, api):
+    api['value'] = 1.0
+    PartitionedStore('pbp', str(tmp_path)).load(
+        [PAST_SEASON], fetch = setup.nflreadr.import_pbp_data
+    )
+
+    api['value'] = 2.0
+    setup.ingest_week(PAST_SEASON, 5, store_dir = str(tmp_path))
+
+    data = PartitionedStore('pbp', str(tmp_path)).read([PAST_SEASON])
+    assert (data.loc[data['week']==5, 'value'] == 2.0).all()
+    assert (data.loc[data['week']!=5, 'value'] == 1.0).all()
+
+def test_ingest_week_in_progress_season_stays_incomplete(tmp_path, api):
+    setup.ingest_week(current_season(), 1, store_dir = str(tmp_path))
+
+    assert PartitionedStore('pbp', str(tmp_path)).missing_seasons([current_season()]) \
+        == [current_season()]
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from warehouse.utilities.team_tensor import TeamWeekTensor
+
+@pytest.fixture
+def features():
+    '''
+    Two made up team-week features, the second missing a bye week
+    '''
+    keys = pd.DataFrame([
+        (season, week, team)
+        for season in [2021, 2022] for week in range(1, 6) for team in ['ARI','ATL','BAL']
+    ], columns = ['season','week','team'])
+    rng = np.random.default_rng(0)
+    epa = keys.assign(epa = rng.normal(size = len(keys)))
+    yards = keys.assign(yards = rng.normal(size = len(keys)))
+    yards = yards[~((yards['team'] == 'ATL') & (yards['week'] == 3))]
+    return epa, yards
+
+def test_add_rejects_duplicate_keys(features):
+    epa, yards = features
+    tensor = TeamWeekTensor.from_frames([epa])
+
+    with pytest.raises(ValueError, match = 'appear more than once'):
+        tensor.add(pd.concat([yards, yards.iloc[:2]]))
+    assert tensor.features == ['epa']
+
+def test_to_frame_matches_merge(features):
+    epa, yards = features
+    tensor = TeamWeekTensor.from_frames([epa, yards])
+
+    expected = epa.merge(yards, how = 'left', on = ['season','week','team'])\
+        .sort_values(['season','team','week']).reset_index(drop = True)
+
+    pd.testing.assert_frame_equal(tensor.to_frame(how = 'left'), expected)
+
+def test_shifted_moves_features_a_week_later(features):
+    epa, _ = features
+    tensor = TeamWeekTensor.from_frames([epa]).shifted(1)
+
+    values, present = tensor.gather([2021, 2021], [1, 2], ['ARI','ARI'])
+    expected = epa.loc[(epa['season'] == 2021) & (epa['week'] == 1) & (epa['team'] == 'ARI'), 'epa']
+    assert not present[0, 0] and np.isnan(values[0, 0])
+    assert values[1, 0] == expected.iloc[0]
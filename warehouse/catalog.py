@@ -2,15 +2,40 @@
 Module with catalog dictionary that returns warehouse functions as well as requirements based on a
 particular key. This allows the functions (and therefore variables) to be loaded in via a config
 file.
+
+'input_columns' lists the play by play columns each function reads on top of
+setup.CORE_PBP_COLUMNS, so only those need to be loaded for a given feature selection.
+
+'params' is a zero-argument callable returning the function arguments, so config data is only
+read (and loaded, see config.Configuration) for the features that are actually run:
+
+entry = build_catalog(config)['pct_pass']
+entry['func'](*entry['params']())
+
+config.TRAILING_WEEKS may also be a list of window sizes. run_feature then returns one frame per
+window with the value columns suffixed _<n>w. The per-week base aggregates the features are built
+from do not depend on the window and are cached (see warehouse.utilities.feature_cache), so each
+extra window only costs the rolling views over them. Entries marked with a 'window' ('mean' /
+'sum') are plain trailing windows of per-week values: those are computed once and every window is
+read off one set of prefix sums. Window independent entries (actual_off_points,
+total_off_epa_sum) take no trailing_weeks and come out once, unsuffixed:
+
+run_feature(build_catalog(config)['pct_pass'], trailing_weeks = [3, 5, 8])
+
+A HalfLife(n) in place of a window size gives exponentially weighted features (see
+warehouse.utilities.rolling).
 '''
 
 REPO_NAME = 'sewer-nfl'
 import sys, os
+import inspect
 cwd = str(os.getcwd())
 repo_dir = cwd[:cwd.find(REPO_NAME)+len(REPO_NAME)]
 sys.path.insert(0,repo_dir)
 
 # Import pipelines
+from warehouse.pipelines.pbp.setup import CORE_PBP_COLUMNS
+from warehouse.utilities.rolling import HalfLife, Weekly, rolling_windows
 from warehouse.pipelines.pbp.involvement import *
 from warehouse.pipelines.pbp.performance import *
 from warehouse.pipelines.pbp.combinations import *
@@ -23,7 +48,8 @@ def build_catalog(config):
 ####################################################################################################
     'turnover_propensity':{
         'func': pipe_turnover_propensity,
-        'params':(
+        'input_columns':['play_type','fixed_drive','fixed_drive_result','complete_pass','qb_hit'],
+        'params':lambda: (
             config.pbp_api_data,
             config.ngs['passing'],
             config.TRAILING_WEEKS
@@ -36,7 +62,8 @@ def build_catalog(config):
     },
     'def_turnover_propensity':{
         'func': pipe_def_turnover_propensity,
-        'params':(
+        'input_columns':['play_type','epa','fixed_drive','fixed_drive_result','complete_pass','qb_hit'],
+        'params':lambda: (
             config.pbp_api_data,
             config.ngs['passing'],
             config.ngs['receiving'],
@@ -50,7 +77,8 @@ def build_catalog(config):
     },
     'balanced_player_efficacy':{
         'func': pipe_epa_hhi_combo,
-        'params':(
+        'input_columns':['play_type','epa','fantasy_player_name','yards_gained'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -61,7 +89,9 @@ def build_catalog(config):
     },
     'points_per_epa':{
         'func': pipe_points_per_epa,
-        'params':(
+        'window':'mean',
+        'input_columns':['posteam_score','play_type','epa'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -72,7 +102,15 @@ def build_catalog(config):
     },
     'off_coaching':{
         'func': pipe_offense_coaching_ability,
-        'params':(
+        'input_columns':[
+            'play_type',
+            'fantasy_player_name',
+            'yards_gained',
+            'fixed_drive',
+            'fixed_drive_result',
+            'game_half'
+        ],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -84,7 +122,8 @@ def build_catalog(config):
     },
     'def_coaching':{
         'func': pipe_defense_coaching_ability,
-        'params':(
+        'input_columns':['series','series_success','fixed_drive','fixed_drive_result','game_half'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -96,7 +135,8 @@ def build_catalog(config):
     },
     'conservative_coverage':{
         'func': pipe_def_burn_commit,
-        'params':(
+        'input_columns':[],
+        'params':lambda: (
             config.ngs['receiving'],
             config.ngs['rushing'],
             config.TRAILING_WEEKS
@@ -108,7 +148,16 @@ def build_catalog(config):
     },
     'offensive_scoring_ability':{
         'func': pipe_offense_scoring_propensity,
-        'params':(
+        'input_columns':[
+            'fixed_drive',
+            'fixed_drive_result',
+            'yardline_100',
+            'play_type',
+            'epa',
+            'series',
+            'series_success'
+        ],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -120,7 +169,16 @@ def build_catalog(config):
     },
     'defensive_scoring_allow':{
         'func': pipe_defense_scoring_allowance,
-        'params':(
+        'input_columns':[
+            'fixed_drive',
+            'fixed_drive_result',
+            'yardline_100',
+            'play_type',
+            'epa',
+            'series',
+            'series_success'
+        ],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -133,7 +191,8 @@ def build_catalog(config):
     },
     'off_big_play_propensity':{
         'func': pipe_offense_big_play,
-        'params':(
+        'input_columns':['play_type','epa','yards_gained','td_team'],
+        'params':lambda: (
             config.pbp_api_data,
             config.ngs['passing'],
             config.TRAILING_WEEKS
@@ -147,7 +206,8 @@ def build_catalog(config):
     },
     'defense_big_play_propensity':{
         'func': pipe_def_big_play,
-        'params':(
+        'input_columns':['play_type','yards_gained','td_team'],
+        'params':lambda: (
             config.pbp_api_data,
             config.ngs['receiving'],
             config.ngs['rushing'],
@@ -161,8 +221,10 @@ def build_catalog(config):
     },
     'time_epa':{
         'func': pipe_garbagetime_epa,
+        'window':'mean',
+        'input_columns':['play_type','wp','epa'],
         'output_columns' : ['normaltime_epa', 'garbagetime_epa'],
-        'params':(
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -173,7 +235,17 @@ def build_catalog(config):
     },
     'overall_coaching':{
         'func': pipe_overall_coaching,
-        'params':(
+        'input_columns':[
+            'play_type',
+            'fantasy_player_name',
+            'yards_gained',
+            'fixed_drive',
+            'fixed_drive_result',
+            'game_half',
+            'series',
+            'series_success'
+        ],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -188,7 +260,9 @@ def build_catalog(config):
 ####################################################################################################
     'yards_per_carry':{
         'func': get_yards_per_rush,
-        'params':(
+        'window':'mean',
+        'input_columns':['play_type','yards_gained'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -201,7 +275,9 @@ def build_catalog(config):
     },
     'yards_per_pass':{
         'func': get_yards_per_pass,
-        'params':(
+        'window':'mean',
+        'input_columns':['play_type','yards_gained'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -213,7 +289,9 @@ def build_catalog(config):
     },
     'epa_per_rush':{
         'func': get_epa_per_rush,
-        'params':(
+        'window':'sum',
+        'input_columns':['play_type','epa'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -225,7 +303,9 @@ def build_catalog(config):
     },
     'epa_per_pass':{
         'func': get_epa_per_pass,
-        'params':(
+        'window':'sum',
+        'input_columns':['play_type','epa'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -237,7 +317,9 @@ def build_catalog(config):
     },
     'off_epa':{
         'func': get_offense_epa,
-        'params':(
+        'window':'mean',
+        'input_columns':['play_type','epa'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -248,7 +330,9 @@ def build_catalog(config):
     },
     'pct_pass':{
         'func': get_pct_pass,
-        'params':(
+        'window':'mean',
+        'input_columns':['play_type'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -259,7 +343,9 @@ def build_catalog(config):
     },
     'pct_run':{
         'func': get_pct_run,
-        'params':(
+        'window':'mean',
+        'input_columns':['play_type'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -270,7 +356,9 @@ def build_catalog(config):
     },
     'team_HHI':{
         'func': get_team_hhi,
-        'params':(
+        'window':'mean',
+        'input_columns':['play_type','fantasy_player_name','yards_gained'],
+        'params':lambda: (
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ),
@@ -281,7 +369,9 @@ def build_catalog(config):
     },
     'team_passing_HHI':{
         'func': get_hhi_by_type,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','fantasy_player_name','yards_gained'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -292,7 +382,9 @@ def build_catalog(config):
     },
     'def_yards_per_pass':{
         'func': get_def_yards_per_pass,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','yards_gained'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -304,7 +396,9 @@ def build_catalog(config):
     },
     'def_yards_per_rush':{
         'func': get_def_yards_per_rush,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','yards_gained'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -316,7 +410,9 @@ def build_catalog(config):
     },
     'def_pass_epa':{
         'func': get_def_epa_per_pass,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','epa'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -328,7 +424,9 @@ def build_catalog(config):
     },
     'def_rush_epa':{
         'func': get_def_epa_per_rush,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','epa'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -340,7 +438,9 @@ def build_catalog(config):
     },
     'points_per_drive':{
         'func': get_points_per_drive,
-        'params':[
+        'window':'mean',
+        'input_columns':['fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -352,7 +452,9 @@ def build_catalog(config):
     },
     'def_points_per_drive':{
         'func': get_def_points_per_drive,
-        'params':[
+        'window':'mean',
+        'input_columns':['fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -364,7 +466,9 @@ def build_catalog(config):
     },
     'points_per_RZ':{
         'func': get_points_per_RZ,
-        'params':[
+        'window':'mean',
+        'input_columns':['yardline_100','fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -377,7 +481,9 @@ def build_catalog(config):
     },
     'def_points_per_RZ':{
         'func': get_def_points_per_RZ,
-        'params':[
+        'window':'mean',
+        'input_columns':['yardline_100','fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -389,7 +495,9 @@ def build_catalog(config):
     },
     'off_ppg':{
         'func': get_points_per_game,
-        'params':[
+        'window':'mean',
+        'input_columns':['posteam_score'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -401,7 +509,9 @@ def build_catalog(config):
     },
     'def_ppg':{
         'func': get_def_points_per_game,
-        'params':[
+        'window':'mean',
+        'input_columns':['posteam_score'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -413,7 +523,9 @@ def build_catalog(config):
     },
     'proportion_leading':{
         'func': get_pct_leading,
-        'params':[
+        'window':'mean',
+        'input_columns':['posteam_score','defteam_score'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -424,7 +536,9 @@ def build_catalog(config):
     },
     'proportion_leading_three':{
         'func': get_pct_leading_three,
-        'params':[
+        'window':'mean',
+        'input_columns':['posteam_score','defteam_score'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -435,7 +549,9 @@ def build_catalog(config):
     },
     'off_turnover_rate':{
         'func': get_drives_in_turnover,
-        'params':[
+        'window':'mean',
+        'input_columns':['fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -447,7 +563,9 @@ def build_catalog(config):
     },
     'def_turnover_rate':{
         'func': get_def_drives_in_turnover,
-        'params':[
+        'window':'mean',
+        'input_columns':['fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -459,9 +577,9 @@ def build_catalog(config):
     },
     'actual_off_points':{
         'func': get_actual_game_points,
-        'params':[
-            config.pbp_api_data,
-            config.TRAILING_WEEKS
+        'input_columns':['posteam_score'],
+        'params':lambda: [
+            config.pbp_api_data
         ],
         'type':'warehouse',
         'ball_side':'off',
@@ -470,9 +588,9 @@ def build_catalog(config):
     },
     'total_off_epa_sum':{
         'func': get_epa_sum,
-        'params':[
-            config.pbp_api_data,
-            config.TRAILING_WEEKS
+        'input_columns':['play_type','epa'],
+        'params':lambda: [
+            config.pbp_api_data
         ],
         'type':'warehouse',
         'ball_side':'off',
@@ -481,7 +599,9 @@ def build_catalog(config):
     },
     'qb_aggr':{
         'func': get_qb_aggr,
-        'params':[
+        'window':'mean',
+        'input_columns':[],
+        'params':lambda: [
             config.ngs['passing'],
             config.TRAILING_WEEKS
         ],
@@ -493,7 +613,9 @@ def build_catalog(config):
     },
     'def_aggr_forced':{
         'func': get_def_qb_aggr,
-        'params':[
+        'window':'mean',
+        'input_columns':[],
+        'params':lambda: [
             config.ngs['passing'],
             config.TRAILING_WEEKS
         ],
@@ -505,7 +627,9 @@ def build_catalog(config):
     },
     'def_box_stuff_rate':{
         'func': get_def_box_stuff,
-        'params':[
+        'window':'mean',
+        'input_columns':[],
+        'params':lambda: [
             config.ngs['rushing'],
             config.TRAILING_WEEKS
         ],
@@ -516,7 +640,9 @@ def build_catalog(config):
     },
     'def_cushion':{
         'func': get_def_cushion,
-        'params':[
+        'window':'mean',
+        'input_columns':[],
+        'params':lambda: [
             config.ngs['receiving'],
             config.TRAILING_WEEKS
         ],
@@ -527,7 +653,9 @@ def build_catalog(config):
     },
     'def_separation':{
         'func': get_def_separation,
-        'params':[
+        'window':'mean',
+        'input_columns':[],
+        'params':lambda: [
             config.ngs['receiving'],
             config.TRAILING_WEEKS
         ],
@@ -538,7 +666,9 @@ def build_catalog(config):
     },
     'off_avg_throw_dist':{
         'func': get_avg_throw_dist,
-        'params':[
+        'window':'mean',
+        'input_columns':[],
+        'params':lambda: [
             config.ngs['passing'],
             config.TRAILING_WEEKS
         ],
@@ -549,7 +679,9 @@ def build_catalog(config):
     },
     'plays_over_25_yd':{
         'func': get_off_plays_25yd,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','yards_gained'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -561,7 +693,9 @@ def build_catalog(config):
     },
     'td_over_25_yd':{
         'func': get_off_td_25yd,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','yards_gained','td_team'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -573,7 +707,9 @@ def build_catalog(config):
     },
     'def_plays_over_25_yd':{
         'func': get_def_plays_25yd,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','yards_gained'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -585,7 +721,9 @@ def build_catalog(config):
     },
     'def_td_over_25_yd':{
         'func': get_def_td_25yd,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','yards_gained','td_team'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -597,7 +735,9 @@ def build_catalog(config):
     },
     'team_scr':{
         'func': get_off_scr,
-        'params':[
+        'window':'mean',
+        'input_columns':['series','series_success'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -609,7 +749,9 @@ def build_catalog(config):
     },
     'defteam_scr':{
         'func': get_def_scr_allowed,
-        'params':[
+        'window':'mean',
+        'input_columns':['series','series_success'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -621,7 +763,9 @@ def build_catalog(config):
     },
     'off_qb_comp':{
         'func': get_qb_comp_rate,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','complete_pass'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -633,7 +777,9 @@ def build_catalog(config):
     },
     'def_qb_comp':{
         'func': qb_def_comp_rate_allowed,
-        'params':[
+        'window':'mean',
+        'input_columns':['play_type','complete_pass'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -645,7 +791,9 @@ def build_catalog(config):
     },
     'off_qbhit':{
         'func': qb_hits_allowed_off,
-        'params':[
+        'window':'mean',
+        'input_columns':['qb_hit'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -657,7 +805,9 @@ def build_catalog(config):
     },
     'def_qbhit':{
         'func': get_def_qb_hits,
-        'params':[
+        'window':'mean',
+        'input_columns':['qb_hit'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -669,7 +819,8 @@ def build_catalog(config):
     },
     'total_season_point_differential':{
         'func': get_season_point_diff,
-        'params':[
+        'input_columns':[],
+        'params':lambda: [
             config.pbp_api_data
         ],
         'type':'warehouse',
@@ -679,7 +830,9 @@ def build_catalog(config):
     },
     'first_drive_pts_avg':{
         'func': get_first_drive_points_scored,
-        'params':[
+        'window':'mean',
+        'input_columns':['fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -691,7 +844,9 @@ def build_catalog(config):
     },
     'first_drive_pts_avg_allowed':{
         'func': get_def_first_drive_points_allowed,
-        'params':[
+        'window':'mean',
+        'input_columns':['fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -703,8 +858,10 @@ def build_catalog(config):
     },
     'yac_air_yards':{
         'func': get_yac_air_yards,
+        'window':'mean',
+        'input_columns':['play_type','complete_pass','air_yards','yards_after_catch'],
         'output_columns': ['trailing_pct_air_yards','trailing_pct_yac'],
-        'params':[
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -715,7 +872,9 @@ def build_catalog(config):
     },
     'h2_first_drive_pts_avg':{
         'func': get_2h_first_drive_points_scored,
-        'params':[
+        'window':'mean',
+        'input_columns':['game_half','fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -727,7 +886,9 @@ def build_catalog(config):
     },
     'h2_first_drive_pts_avg_allowed':{
         'func': get_2h_def_first_drive_points_allowed,
-        'params':[
+        'window':'mean',
+        'input_columns':['game_half','fixed_drive','fixed_drive_result'],
+        'params':lambda: [
             config.pbp_api_data,
             config.TRAILING_WEEKS
         ],
@@ -739,4 +900,67 @@ def build_catalog(config):
     }
     }
 
-    return FUNCTION_CATALOG
\ No newline at end of file
+    return FUNCTION_CATALOG
+
+def required_pbp_columns(features = None):
+    '''
+    Union of play by play columns needed to build the given catalog keys (all keys if None)
+    '''
+    # params are only bound when called, so no configuration (or data) is needed to inspect
+    catalog = build_catalog(None)
+    features = catalog.keys() if features is None else features
+
+    columns = list(CORE_PBP_COLUMNS)
+    for key in features:
+        columns += [c for c in catalog[key]['input_columns'] if c not in columns]
+
+    return columns
+
+# Columns features are joined on, never suffixed
+KEY_COLUMNS = ['season','week','team','posteam','defteam']
+
+def window_suffix(trailing_weeks):
+    if isinstance(trailing_weeks, HalfLife):
+        return f'_hl{trailing_weeks.weeks}'
+    return f'_{trailing_weeks}w'
+
+def run_feature(entry, trailing_weeks = None):
+    '''
+    Results of a catalog entry as a list of frames, one per trailing window. trailing_weeks (a
+    window size, a HalfLife or a list of them) overrides the configured window. With a list, value
+    columns are suffixed _<n>w (_hl<n> for a HalfLife). Entries without a trailing_weeks parameter
+    are run once, unsuffixed. Entries with a 'window' (how their per-week values are rolled) are
+    run once with Weekly() and every window is rolled from those values.
+    '''
+    bound = inspect.signature(entry['func']).bind(*entry['params']())
+    if 'trailing_weeks' not in bound.arguments:
+        return [entry['func'](*bound.args, **bound.kwargs)]
+
+    windows = bound.arguments['trailing_weeks'] if trailing_weeks is None else trailing_weeks
+    if not isinstance(windows, (list, tuple)):
+        bound.arguments['trailing_weeks'] = windows
+        return [entry['func'](*bound.args, **bound.kwargs)]
+
+    if 'window' in entry:
+        bound.arguments['trailing_weeks'] = Weekly()
+        weekly = entry['func'](*bound.args, **bound.kwargs)
+        keys = [c for c in weekly.columns if c in KEY_COLUMNS]
+        values = [c for c in weekly.columns if c not in KEY_COLUMNS]
+        team = [c for c in keys if c not in ['season','week']]
+        # Windows run down each team's season, rolled frames align back on the index
+        ordered = weekly.sort_values(['season'] + team + ['week'], kind = 'stable')
+        rolled = rolling_windows(ordered, values, windows, entry['window'], ['season'] + team)
+        return [
+            weekly[keys].assign(**{f'{c}{window_suffix(n)}': frame[c] for c in values})
+            for n, frame in zip(windows, rolled)
+        ]
+
+    results = []
+    for n in windows:
+        bound.arguments['trailing_weeks'] = n
+        result = entry['func'](*bound.args, **bound.kwargs)
+        results.append(result.rename(columns = {
+            c: f'{c}{window_suffix(n)}' for c in result.columns if c not in KEY_COLUMNS
+        }))
+
+    return results
@@ -1,21 +1,125 @@
 '''
 Variable configurations (to be loaded as default args in catalog)
+
+Data (pbp_api_data, ngs, roster_api_data) is loaded on first access and kept for the life of the
+Configuration, so building one is free and only the frames a set of features reads are loaded.
 '''
 
-from warehouse.pipelines.pbp.setup import setup_pbp
+from functools import cached_property
+from collections.abc import Mapping
+from warehouse.pipelines.pbp.setup import load_pbp, load_ngs, load_roster, game_schedule, \
+    select_games, NGS_TYPES, SCHEDULE_COLUMNS
+from warehouse.pipelines.pbp.players import PlayerIds, player_ids_path, player_dimension
+from warehouse.catalog import required_pbp_columns
 # Set Variables
 
+class LazyNGS(Mapping):
+    '''
+    ngs['rushing' | 'receiving' | 'passing'], each table loaded by loader(stat_type) when
+    first accessed
+    '''
+
+    def __init__(self, loader):
+
+        self.loader = loader
+        self.loaded = {}
+
+    def __getitem__(self, stat_type):
+        if stat_type not in NGS_TYPES:
+            raise KeyError(stat_type)
+        if stat_type not in self.loaded:
+            self.loaded[stat_type] = self.loader(stat_type)
+        return self.loaded[stat_type]
+
+    def __iter__(self):
+        return iter(NGS_TYPES)
+
+    def __len__(self):
+        return len(NGS_TYPES)
+
 class Configuration():
-    def __init__(self):
+    def __init__(
+            self,
+            features = None,
+            starting_year = 2016,
+            ending_year = 2022,
+            offline = False,
+            trailing_weeks = 5,
+            teams = None,
+            max_week = None
+    ):
 
         self.ONLY_REGULAR_SEASON = True
-        self.STARTING_YEAR = 2016
-        self.ENDING_YEAR = 2022
+        self.STARTING_YEAR = starting_year
+        self.ENDING_YEAR = ending_year
+
+        # Window size, HalfLife (exponentially weighted), or a list of them to build every feature
+        # for each (see catalog.run_feature)
+        self.TRAILING_WEEKS = trailing_weeks
+
+        # Read only from the local pbp store (cache/pbp_store), never the API
+        self.OFFLINE = offline
 
-        self.TRAILING_WEEKS = 5
+        # Catalog keys to build (None for all), pbp is only loaded with the columns they read
+        self.FEATURES = features
+        self.PBP_COLUMNS = required_pbp_columns(self.FEATURES)
 
-        self.pbp_api_data, self.ngs = setup_pbp(
+        # Only the games of these teams, up to this week (None for all). Features of those teams
+        # come out exactly as from the full data, other teams' rows are partial
+        self.TEAMS = teams
+        self.MAX_WEEK = max_week
+
+    def read_pbp(self, columns):
+        if self.TEAMS is not None:
+            columns = columns + [c for c in ['home_team','away_team'] if c not in columns]
+        api_data = load_pbp(
             only_regular_season=self.ONLY_REGULAR_SEASON,
             starting_year=self.STARTING_YEAR,
-            ending_year=self.ENDING_YEAR
+            ending_year=self.ENDING_YEAR,
+            offline=self.OFFLINE,
+            columns=columns
         )
+        return select_games(api_data, self.TEAMS, self.MAX_WEEK)
+
+    @cached_property
+    def pbp_api_data(self):
+        return self.read_pbp(self.PBP_COLUMNS)
+
+    @cached_property
+    def schedule(self):
+        # NGS only needs the team / week keys, so avoid a full pbp load when it isn't there yet
+        if 'pbp_api_data' in self.__dict__:
+            return game_schedule(self.pbp_api_data)
+        return game_schedule(self.read_pbp(SCHEDULE_COLUMNS))
+
+    @cached_property
+    def ngs(self):
+        return LazyNGS(lambda stat_type: select_games(
+            load_ngs(
+                stat_type,
+                self.schedule,
+                starting_year=self.STARTING_YEAR,
+                ending_year=self.ENDING_YEAR,
+                offline=self.OFFLINE
+            ),
+            self.TEAMS,
+            self.MAX_WEEK,
+            team_cols=['team_abbr','defteam']
+        ))
+
+    @cached_property
+    def roster_api_data(self):
+        return load_roster(
+            starting_year=self.STARTING_YEAR,
+            ending_year=self.ENDING_YEAR,
+            offline=self.OFFLINE
+        )
+
+    @property
+    def player_ids(self):
+        # Read fresh, loading pbp / rosters may have added players
+        return PlayerIds.load(player_ids_path())
+
+    @cached_property
+    def players(self):
+        return player_dimension(self.roster_api_data, self.player_ids)
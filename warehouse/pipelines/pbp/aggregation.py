@@ -0,0 +1,151 @@
+"""
+Single pass team-week aggregation over play by play data.
+
+team_week_base(api_data, side) scans pbp once and returns one row per (season, week, team) with
+every sum / count / max the team-week functions in performance.py are built from, either for the
+offense (side = 'off', grouped on posteam) or the defense (side = 'def', grouped on defteam).
+Those functions are thin views over this table (select the rows where the relevant plays happened,
+divide, roll), so building the whole catalog groups the full pbp frame twice instead of once per
+feature.
+
+Measures whose input columns were not loaded (see catalog 'input_columns') are skipped.
+
+"""
+import pandas as pd
+from warehouse.utilities.feature_cache import feature_cache as cache
+from warehouse.utilities.rolling import rolling_window
+
+SIDE_COLUMNS = {
+    'off': 'posteam',
+    'def': 'defteam'
+}
+
+SCRIMMAGE_PLAYS = ['run','pass']
+
+def frequent_passers(api_data, min_passes = 10):
+    '''
+    Players with more than min_passes pass attempts, used to pick out QB runs
+    '''
+    counts = api_data['passer_player_name'].value_counts()
+    return list(counts[counts > min_passes].index)
+
+def is_big_play(api_data):
+    return api_data['play_type'].isin(SCRIMMAGE_PLAYS) & (api_data['yards_gained'] >= 25)
+
+def is_completion(api_data):
+    return (api_data['play_type']=='pass') & (api_data['complete_pass'] == 1)
+
+# values: (input columns, per play values, {output column: aggregation})
+# Values are NaN on plays they don't apply to, so sum / count / max only see the plays that do
+MEASURES = {
+    'plays': ([], lambda d: d['play_counter'], {'plays':'sum'}),
+    'is_run': (['play_type'], lambda d: d['play_type']=='run', {'run_plays':'sum'}),
+    'is_pass': (['play_type'], lambda d: d['play_type']=='pass', {'pass_plays':'sum'}),
+    'is_scrimmage': (
+        ['play_type'],
+        lambda d: d['play_type'].isin(SCRIMMAGE_PLAYS),
+        {'scrimmage_plays':'sum'}
+    ),
+    'run_yards': (
+        ['play_type','yards_gained'],
+        lambda d: d['yards_gained'].where(d['play_type']=='run'),
+        {'run_yards':'sum'}
+    ),
+    'pass_yards': (
+        ['play_type','yards_gained'],
+        lambda d: d['yards_gained'].where(d['play_type']=='pass'),
+        {'pass_yards':'sum'}
+    ),
+    'run_epa': (
+        ['play_type','epa'],
+        lambda d: d['epa'].where(d['play_type']=='run'),
+        {'run_epa':'sum', 'run_epa_plays':'count'}
+    ),
+    'pass_epa': (
+        ['play_type','epa'],
+        lambda d: d['epa'].where(d['play_type']=='pass'),
+        {'pass_epa':'sum', 'pass_epa_plays':'count'}
+    ),
+    'scrimmage_epa': (
+        ['play_type','epa'],
+        lambda d: d['epa'].where(d['play_type'].isin(SCRIMMAGE_PLAYS)),
+        {'scrimmage_epa':'sum', 'scrimmage_epa_plays':'count'}
+    ),
+    'pass_complete': (
+        ['play_type','complete_pass'],
+        lambda d: d['complete_pass'].where(d['play_type']=='pass'),
+        {'pass_complete':'sum'}
+    ),
+    'is_completion': (['play_type','complete_pass'], is_completion, {'completions':'sum'}),
+    'completion_air_yards': (
+        ['play_type','complete_pass','air_yards'],
+        lambda d: d['air_yards'].where(is_completion(d)),
+        {'completion_air_yards':'sum'}
+    ),
+    'completion_yac': (
+        ['play_type','complete_pass','yards_after_catch'],
+        lambda d: d['yards_after_catch'].where(is_completion(d)),
+        {'completion_yac':'sum'}
+    ),
+    'qb_hit': (['qb_hit'], lambda d: d['qb_hit'], {'qb_hits':'sum'}),
+    'series_success': (['series_success'], lambda d: d['series_success'], {'series_success':'sum'}),
+    'posteam_score': (['posteam_score'], lambda d: d['posteam_score'], {'posteam_score_max':'max'}),
+    'is_big_play': (['play_type','yards_gained'], is_big_play, {'big_plays':'sum'}),
+    'is_big_play_td': (
+        ['play_type','yards_gained','td_team'],
+        lambda d: is_big_play(d) & d['td_team'].notnull(),
+        {'big_play_tds':'sum'}
+    ),
+    'qb_rush_yards': (
+        ['passer_player_name','rusher_player_name','qb_scramble','yards_gained'],
+        lambda d: d['yards_gained'].where(
+            d['rusher_player_name'].isin(frequent_passers(d)) | (d['qb_scramble']==1)
+        ),
+        {'qb_rush_yards':'sum'}
+    )
+}
+
+@cache.memoize()
+def team_week_base(api_data, side = 'off'):
+    '''
+    One row per (season, week, team) with every measure in MEASURES that api_data has the
+    columns for, team being posteam (side = 'off') or defteam (side = 'def'). Sorted by
+    season / team / week, the order the trailing windows run in.
+    '''
+    team_col = SIDE_COLUMNS[side]
+
+    values = {}
+    aggregations = {}
+    for name, (columns, func, outputs) in MEASURES.items():
+        if not set(columns).issubset(api_data.columns):
+            continue
+        values[name] = func(api_data)
+        aggregations.update({out: (name, agg) for out, agg in outputs.items()})
+
+    frame = pd.DataFrame({
+        'season': api_data['season'],
+        'week': api_data['week'],
+        'team': api_data[team_col],
+        **values
+    })
+    base = frame.groupby(['season','week','team'], as_index=False, observed=True)\
+        .agg(**aggregations)
+
+    return base.sort_values(['season','team','week']).reset_index(drop=True)
+
+def trailing(data, columns, trailing_weeks = 5, how = 'mean'):
+    '''
+    Rolling window (by rows, so bye weeks are skipped) over each team's season, data sorted by
+    season / team / week
+    '''
+    return rolling_window(data, columns, trailing_weeks, how, group_cols = ['season','team'])
+
+def team_week_view(base, value, name, trailing_weeks = 5, rows = None, how = 'mean'):
+    '''
+    Trailing feature from a team_week_base table: value (a Series aligned with base) over the
+    rows where rows is True (all rows if None), returned as season / week / team / name
+    '''
+    view = base[['season','week','team']].assign(**{name: value})
+    if rows is not None:
+        view = view[rows].reset_index(drop=True)
+    return view.assign(**{name: trailing(view, name, trailing_weeks, how)})
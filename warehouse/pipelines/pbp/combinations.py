@@ -3,7 +3,6 @@ import scipy as scipy
 import numpy as np
 import pandas as pd
 import requests as requests
-import functools as ft
 
 
 REPO_NAME = 'sewer-nfl'
@@ -12,7 +11,11 @@ repo_dir = cwd[:cwd.find(REPO_NAME)+len(REPO_NAME)]
 sys.path.insert(0,repo_dir)
 
 from warehouse.pipelines.pbp.performance import *
+from warehouse.utilities.rolling import rolling_window, warmup_weeks
+from warehouse.utilities.feature_cache import feature_cache as cache
+from warehouse.utilities.team_tensor import TeamWeekTensor
 
+@cache.memoize()
 def pipe_turnover_propensity(api_data, next_gen_stats_pass, trailing_weeks = 5):
 
     # TURNOVER PROPENSITY
@@ -38,7 +41,7 @@ def pipe_turnover_propensity(api_data, next_gen_stats_pass, trailing_weeks = 5):
 
     dfs = [temp_pct_pass, temp_drives_in_turnover, temp_qb_aggr, temp_qb_comp_rate, temp_qb_hits_allowed_off]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team'], how='left'), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'left')
 
     names_df = df_final[['season','week','team']]
 
@@ -74,6 +77,7 @@ def pipe_turnover_propensity(api_data, next_gen_stats_pass, trailing_weeks = 5):
 
     return(output_df)
 
+@cache.memoize()
 def pipe_def_turnover_propensity(api_data, next_gen_stats_pass, next_gen_stats_rec, trailing_weeks = 5):
 
     # TURNOVER PROPENSITY def ability
@@ -106,7 +110,7 @@ def pipe_def_turnover_propensity(api_data, next_gen_stats_pass, next_gen_stats_r
 
     dfs = [temp_def_epa_pass, temp_def_qb_aggr, temp_def_turnover, temp_def_cushion, temp_def_separation, temp_def_comp_rate, temp_def_qb_hits]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team']), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'inner')
 
     names_df = df_final[['season','week','team']]
 
@@ -143,6 +147,7 @@ def pipe_def_turnover_propensity(api_data, next_gen_stats_pass, next_gen_stats_r
 
     return(output_df)
 
+@cache.memoize()
 def pipe_epa_hhi_combo(api_data, trailing_weeks = 5):
 
     # EPA times HHI
@@ -159,7 +164,7 @@ def pipe_epa_hhi_combo(api_data, trailing_weeks = 5):
 
     dfs = [temp_offense_epa, temp_team_hhi]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team']), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'inner')
     print(df_final.keys())
     df_final['off_epa'] = ((df_final['total_off_epa_sum'] + 70)/150) * .6
 
@@ -172,6 +177,7 @@ def pipe_epa_hhi_combo(api_data, trailing_weeks = 5):
 
     return(output_df[['season','week','team','balanced_player_efficacy']])
 
+@cache.memoize()
 def pipe_points_per_epa(api_data, trailing_weeks = 5):
 
     # Points per EPA
@@ -186,7 +192,7 @@ def pipe_points_per_epa(api_data, trailing_weeks = 5):
 
     dfs = [temp_off_points, temp_offense_epa]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team']), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'inner')
 
     df_final['off_epa'] = (df_final['total_off_epa_sum'] + 70) / 150
 
@@ -198,7 +204,7 @@ def pipe_points_per_epa(api_data, trailing_weeks = 5):
 
     mid_df = df_final.sort_values(['season','team','week'])
 
-    df_final = mid_df.assign(rolling_points_per_epa = mid_df.groupby(['season','team'], as_index = False)['points_per_epa'].rolling(trailing_weeks).mean()['points_per_epa'])[['season','week','team','rolling_points_per_epa']]
+    df_final = mid_df.assign(rolling_points_per_epa = rolling_window(mid_df, 'points_per_epa', trailing_weeks, group_cols = ['season','team']))[['season','week','team','rolling_points_per_epa']]
 
     df_final = df_final.rename(columns = {'rolling_points_per_epa':'points_per_epa'})
 
@@ -206,6 +212,7 @@ def pipe_points_per_epa(api_data, trailing_weeks = 5):
 
     return(df_final.reset_index(drop=True)[['season','week','team','points_per_epa']])
 
+@cache.memoize()
 def pipe_offense_coaching_ability(api_data, trailing_weeks = 5):
 
     # offensive coaching ability
@@ -226,7 +233,7 @@ def pipe_offense_coaching_ability(api_data, trailing_weeks = 5):
 
     dfs = [temp_team_hhi, temp_first_drive, temp_2h_first_drive]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team']), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'inner')
 
     df_final['team_HHI'] = (1 - ((df_final['team_HHI'] - .12)/.5)) * .25
     df_final['first_drive_pts_avg'] = (df_final['first_drive_pts_avg'] / 7 ) * .6
@@ -238,6 +245,7 @@ def pipe_offense_coaching_ability(api_data, trailing_weeks = 5):
 
     return(df_final)
 
+@cache.memoize()
 def pipe_defense_coaching_ability(api_data, trailing_weeks = 5):
 
     # defensive coaching ability
@@ -258,7 +266,7 @@ def pipe_defense_coaching_ability(api_data, trailing_weeks = 5):
 
     dfs = [temp_team_scr, temp_first_drive, temp_2h_first_drive]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team']), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'inner')
 
 
     df_final['defteam_scr'] = ((df_final['defteam_scr'] - 20) / 50) * .3
@@ -270,6 +278,7 @@ def pipe_defense_coaching_ability(api_data, trailing_weeks = 5):
 
     return(df_final)
 
+@cache.memoize()
 def pipe_def_burn_commit(next_gen_stats_rec, next_gen_stats_rush, trailing_weeks = 5):
 
     # mobile QB / burner susceptibility (press and box stuff rates)
@@ -287,12 +296,12 @@ def pipe_def_burn_commit(next_gen_stats_rec, next_gen_stats_rush, trailing_weeks
 
     dfs = [temp_def_cushion, temp_def_separation, temp_def_box_stuff]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team'], how='left'), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'left')
 
     # changing def_box_stuff_rate NA to the median of all weeks
-    med = df_final.groupby(['season','team'])['def_box_stuff_rate'].transform('median')
+    med = df_final.groupby(['season','team'], observed=True)['def_box_stuff_rate'].transform('median')
     df_final['def_box_stuff_rate'] = df_final['def_box_stuff_rate'].fillna(med)
-    df_final['def_box_stuff_rate'] = np.where(df_final['week']<trailing_weeks, np.nan, df_final['def_box_stuff_rate'])
+    df_final['def_box_stuff_rate'] = np.where(df_final['week']<warmup_weeks(trailing_weeks), np.nan, df_final['def_box_stuff_rate'])
 
     df_final['def_cushion'] = .5 * ((df_final['def_cushion'] - 4) / 5)
     df_final['def_separation'] = .5 * ((df_final['def_separation'] - 1.5) / 3)
@@ -306,6 +315,7 @@ def pipe_def_burn_commit(next_gen_stats_rec, next_gen_stats_rush, trailing_weeks
 
     return(df_final)
 
+@cache.memoize()
 def pipe_offense_scoring_propensity(api_data, trailing_weeks = 5):
 
     # Scoring propensity
@@ -334,7 +344,7 @@ def pipe_offense_scoring_propensity(api_data, trailing_weeks = 5):
 
     dfs = [temp_points_per_drive, temp_points_per_RZ, temp_drives_in_turnover, temp_epa_per_pass, temp_epa_per_rush, temp_off_scr]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team'], how='left'), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'left')
 
     names_df = df_final[['season','week','team']]
 
@@ -370,6 +380,7 @@ def pipe_offense_scoring_propensity(api_data, trailing_weeks = 5):
 
     return(output_df)
 
+@cache.memoize()
 def pipe_defense_scoring_allowance(api_data, trailing_weeks = 5):
 
     # scoring allow defense
@@ -397,7 +408,7 @@ def pipe_defense_scoring_allowance(api_data, trailing_weeks = 5):
 
     dfs = [temp_def_ppd, temp_def_pprz, temp_def_turnovers, temp_def_pass_epa, temp_def_rush_epa, temp_def_scr]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team'], how='left'), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'left')
 
     names_df = df_final[['season','week','team']]
 
@@ -433,6 +444,7 @@ def pipe_defense_scoring_allowance(api_data, trailing_weeks = 5):
 
     return(output_df)
 
+@cache.memoize()
 def pipe_offense_big_play(api_data, next_gen_stats_pass, trailing_weeks = 5):
 
     # Big play propensity
@@ -456,7 +468,7 @@ def pipe_offense_big_play(api_data, next_gen_stats_pass, trailing_weeks = 5):
 
     dfs = [temp_pct_pass, temp_avg_throw_dist, temp_epa_per_pass, temp_off_plays_25yd, temp_off_td_25yd]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team'], how='left'), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'left')
 
     # setting baseline as zero for certain columns
     df_final['pct_pass'] = df_final['pct_pass'] - .3
@@ -493,6 +505,7 @@ def pipe_offense_big_play(api_data, next_gen_stats_pass, trailing_weeks = 5):
     return(output_df)
 
 
+@cache.memoize()
 def pipe_def_big_play(api_data, next_gen_stats_rec, next_gen_stats_rush, trailing_weeks = 5):
 
     # Big play propensity allowed defense
@@ -515,7 +528,7 @@ def pipe_def_big_play(api_data, next_gen_stats_rec, next_gen_stats_rush, trailin
 
     dfs = [temp_def_yards_pass, temp_def_plays_25, temp_def_td_25, temp_burn_commit]
 
-    df_final = ft.reduce(lambda left, right: pd.merge(left, right, on=['season','week','team'], how='left'), dfs)
+    df_final = TeamWeekTensor.from_frames(dfs).to_frame(how = 'left')
 
     names_df = df_final[['season','week','team']]
 
@@ -549,6 +562,7 @@ def pipe_def_big_play(api_data, next_gen_stats_rec, next_gen_stats_rush, trailin
 
     return(output_df[['season','week','team','defense_big_play_propensity']])
 
+@cache.memoize()
 def pipe_garbagetime_epa(api_data, trailing_weeks = 5):
 
     # pipeline (kind of) for normaltime and garbagetime epa
@@ -556,21 +570,22 @@ def pipe_garbagetime_epa(api_data, trailing_weeks = 5):
     prob_cutoff = .2
 
     # normal
-    combined_standard = api_data[(api_data['play_type'].isin(['run','pass'])) & (api_data['wp'] > prob_cutoff) & (api_data['wp'] < (1-prob_cutoff))].groupby(['season','week','posteam'], as_index = False)['epa'].mean().rename(columns = {'epa':'standard_epa'}).sort_values(['season','posteam','week']).reset_index(drop=True)
+    combined_standard = api_data[(api_data['play_type'].isin(['run','pass'])) & (api_data['wp'] > prob_cutoff) & (api_data['wp'] < (1-prob_cutoff))].groupby(['season','week','posteam'], as_index = False, observed = True)['epa'].mean().rename(columns = {'epa':'standard_epa'}).sort_values(['season','posteam','week']).reset_index(drop=True)
 
     # garbage time
-    combined_garbage = api_data[(api_data['play_type'].isin(['run','pass'])) & ((api_data['wp'] < prob_cutoff) | (api_data['wp'] > (1-prob_cutoff)))].groupby(['season','week','posteam'], as_index = False)['epa'].mean().rename(columns = {'epa':'garbage_epa'}).sort_values(['season','posteam','week']).reset_index(drop=True)
+    combined_garbage = api_data[(api_data['play_type'].isin(['run','pass'])) & ((api_data['wp'] < prob_cutoff) | (api_data['wp'] > (1-prob_cutoff)))].groupby(['season','week','posteam'], as_index = False, observed = True)['epa'].mean().rename(columns = {'epa':'garbage_epa'}).sort_values(['season','posteam','week']).reset_index(drop=True)
 
     # doing the same thing but for overall
     mid_combined_2 = combined_standard.merge(combined_garbage, how = 'inner',on = ['season','week','posteam'])
 
     # adding the rolling columns
-    comb_df = mid_combined_2.groupby(['season','posteam'], as_index = False)[['standard_epa', 'garbage_epa']].rolling(trailing_weeks).mean().rename(columns = {'standard_epa':'normal_epa','garbage_epa':'garbagetime_epa'})
+    comb_df = rolling_window(mid_combined_2, ['standard_epa', 'garbage_epa'], trailing_weeks, group_cols = ['season','posteam']).rename(columns = {'standard_epa':'normal_epa','garbage_epa':'garbagetime_epa'})
 
     output_df = pd.concat([mid_combined_2, comb_df[['normal_epa','garbagetime_epa']]], axis = 1)[['season','week','posteam','normal_epa','garbagetime_epa']].rename(columns = {'posteam':'team', 'normal_epa':'normaltime_epa'})
 
     return(output_df.reset_index(drop=True))
 
+@cache.memoize()
 def pipe_overall_coaching(api_data, trailing_weeks = 5):
 
     # pipe_offense_coaching_ability
@@ -581,7 +596,7 @@ def pipe_overall_coaching(api_data, trailing_weeks = 5):
     # pipe_defense_coaching_ability
     temp_def_coaching = pipe_defense_coaching_ability(api_data, trailing_weeks)
 
-    mid_df = temp_off_coaching.merge(temp_def_coaching, on = ['season','week','team'], how = 'left')
+    mid_df = TeamWeekTensor.from_frames([temp_off_coaching, temp_def_coaching]).to_frame(how = 'left')
 
     mid_df['def_coaching'] = 1.5 + mid_df['def_coaching']
 
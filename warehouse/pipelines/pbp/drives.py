@@ -0,0 +1,93 @@
+"""
+Drive level fact table built once from play by play data.
+
+drive_table(api_data) has one row per (game, fixed_drive) with the offense / defense, the half
+it ended in, whether it reached the red zone, its result, the points it produced, whether it
+ended in a turnover and how many snaps it had. Points per drive, red zone scoring, first drive
+and turnover rate features are grouped reductions over it (see team_drive_summary).
+
+Columns that were not loaded are skipped: without game_half there are no second half flags,
+without yardline_100 no red zone flag.
+
+"""
+import numpy as np
+import pandas as pd
+from warehouse.utilities.feature_cache import feature_cache as cache
+from warehouse.pipelines.pbp.aggregation import SIDE_COLUMNS
+
+RESULT_POINTS = {
+    'Touchdown': 7,
+    'Field goal': 3
+}
+
+RED_ZONE = 20
+
+# Drive results counted against the offense in the turnover rates
+TURNOVER_RESULTS = ['Turnover','Opp touchdown']
+
+def result_points(results):
+    '''
+    Points credited to a drive result (touchdowns as 7, so extra points are ignored)
+    '''
+    points = np.zeros(len(results))
+    for result, value in RESULT_POINTS.items():
+        points[(results == result).to_numpy()] = value
+    return points
+
+def first_by_team(drives, rows = None):
+    '''
+    True on the earliest drive of each offense in each game, among rows if given
+    '''
+    candidates = drives if rows is None else drives[rows]
+    first = candidates.groupby(['game_id','posteam'], observed=True)['fixed_drive'].transform('min')
+    return (candidates['fixed_drive'] == first).reindex(drives.index, fill_value = False)
+
+@cache.memoize()
+def drive_table(api_data):
+    '''
+    One row per (game, fixed_drive):
+
+    season, week, game_id, fixed_drive, posteam, defteam, game_half, result, points,
+    turnover, snaps (plays with a posteam), red_zone, first_drive, first_half2_drive
+    '''
+    columns = ['season','week','game_id','fixed_drive','posteam','defteam','fixed_drive_result'] + \
+        [c for c in ['game_half','yardline_100'] if c in api_data.columns]
+    plays = api_data[columns].assign(snap = api_data['posteam'].notnull())
+    aggregations = {
+        'season': ('season', 'first'),
+        'week': ('week', 'first'),
+        'posteam': ('posteam', 'first'),
+        'defteam': ('defteam', 'first'),
+        'result': ('fixed_drive_result', 'first'),
+        'snaps': ('snap', 'sum')
+    }
+    if 'game_half' in api_data.columns:
+        # Half the drive ended in, so a drive with any second half snap counts as a second half drive
+        aggregations['game_half'] = ('game_half', 'last')
+    if 'yardline_100' in api_data.columns:
+        plays = plays.assign(in_red_zone = api_data['yardline_100'] <= RED_ZONE)
+        aggregations['red_zone'] = ('in_red_zone', 'max')
+
+    drives = plays.groupby(['game_id','fixed_drive'], as_index=False, observed=True)\
+        .agg(**aggregations)
+
+    drives['points'] = result_points(drives['result'])
+    drives['turnover'] = drives['result'].isin(TURNOVER_RESULTS)
+    drives['first_drive'] = first_by_team(drives)
+    if 'game_half' in drives.columns:
+        drives['first_half2_drive'] = first_by_team(drives, drives['game_half'] == 'Half2')
+
+    return drives
+
+def team_drive_summary(drives, side = 'off', rows = None, how = 'mean', columns = ['points']):
+    '''
+    Drive columns reduced (mean, sum, ...) to one row per (season, week, team) for the offense
+    (side = 'off') or defense (side = 'def'), over the drives where rows is True. Sorted by
+    season / team / week like aggregation.team_week_base.
+    '''
+    drives = drives if rows is None else drives[rows]
+    summary = drives.groupby(['season','week',SIDE_COLUMNS[side]], as_index=False, observed=True)\
+        [columns].agg(how)
+
+    return summary.rename(columns = {SIDE_COLUMNS[side]:'team'})\
+        .sort_values(['season','team','week']).reset_index(drop=True)
@@ -1,6 +1,7 @@
 """Module Docstring"""
 
 import pandas as pd
+from warehouse.pipelines.pbp.participation import ParticipationStore
 pd.options.mode.chained_assignment = None
 
 # players_involved(
@@ -16,7 +17,13 @@ def players_involved(player_involvement_df,
                      side_var = 'variable',
                      side = 'offense' # offense, defense, both
                      ):
-    """Function Docstring"""
+    """
+    Players on the field for one play. player_involvement_df can be a ParticipationStore, which
+    answers from its (game_id, play_id) index instead of scanning every row
+    """
+    if isinstance(player_involvement_df, ParticipationStore):
+        return player_involvement_df.players(game_id, play_id, side)
+
     res = player_involvement_df[
             (player_involvement_df['play_id']==play_id) & \
             (player_involvement_df['game_id']==game_id)
@@ -43,7 +50,13 @@ def player_involved(
     game_id = None, # Optional
     id_col = 'value' # Required
 ):
-    """Function Docstring"""
+    """
+    Participation rows of one player. player_involvement_df can be a ParticipationStore, which
+    answers from its player index instead of scanning every row
+    """
+    if isinstance(player_involvement_df, ParticipationStore):
+        return player_involvement_df.plays(player_id, play_id, game_id)
+
     res = player_involvement_df[
         (player_involvement_df[id_col]==player_id)
     ]
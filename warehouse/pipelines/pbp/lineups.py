@@ -0,0 +1,106 @@
+"""
+Integer coded on-field lineups, a compact alternative to involvement.player_involvement.
+
+Every GSIS player id is interned once in a PlayerIds dictionary (id <-> int32 code, the
+persisted one by default so codes match the pbp and roster player keys, see players.py) and each
+play's lineup is stored as a row of a fixed (plays x 11) int32 array per side, -1 marking an
+empty slot. That is 88 bytes per play for both sides instead of 22 melted rows of Python
+strings, and lineup aggregations are plain array operations on the codes. The melted long view
+is rebuilt on demand by Lineups.long().
+
+Example:
+
+lineups = Lineups.from_pbp(api_data)
+lineups.offense[:5]                    # codes of the first five offensive lineups
+lineups.ids.lookup(lineups.offense[0]) # back to GSIS ids
+lineups.long()                         # same layout as player_involvement(api_data)
+
+"""
+import numpy as np
+import pandas as pd
+from warehouse.pipelines.pbp.store import STORE_DIR
+from warehouse.pipelines.pbp.players import interned, EMPTY
+
+LINEUP_SIZE = 11
+
+PLAY_COLUMNS = [
+    'play_id',
+    'game_id',
+    'home_team',
+    'away_team',
+    'posteam',
+    'posteam_type'
+]
+
+# Lineup column, prefix of its melted slot names
+SIDE_COLUMNS = {
+    'offense_players': 'o',
+    'defense_players': 'd'
+}
+
+def lineup_codes(players, ids):
+    '''
+    (plays x 11) int32 codes of a ';' separated lineup column, slots past the 11th dropped
+    '''
+    slots = players.fillna('').str.split(';').explode()
+    position = slots.groupby(level = 0).cumcount().to_numpy()
+    row = players.index.get_indexer(slots.index)
+
+    codes = np.full((len(players), LINEUP_SIZE), EMPTY, dtype = np.int32)
+    keep = position < LINEUP_SIZE
+    codes[row[keep], position[keep]] = ids.intern(slots.to_numpy()[keep])
+
+    return codes
+
+class Lineups():
+    '''
+
+    Play keys with int32 offense / defense lineup arrays (plays x 11) coded by a PlayerIds
+    dictionary, which can be shared across seasons and other player tables
+
+    '''
+
+    def __init__(self, plays, offense, defense, ids):
+
+        self.plays = plays
+        self.offense = offense
+        self.defense = defense
+        self.ids = ids
+
+    @classmethod
+    def from_pbp(cls, pbp_data, ids = None, store_dir = STORE_DIR):
+        '''
+        Lineups of every play in pbp_data, interning into ids (the dictionary persisted in
+        store_dir if None, saved when new ids were added)
+        '''
+        if ids is None:
+            return interned(lambda ids: cls.from_pbp(pbp_data, ids), store_dir)[0]
+        plays = pbp_data[PLAY_COLUMNS].reset_index(drop = True)
+        offense, defense = [
+            lineup_codes(pbp_data[col].reset_index(drop = True), ids) for col in SIDE_COLUMNS
+        ]
+        return cls(plays, offense, defense, ids)
+
+    def __len__(self):
+        return len(self.plays)
+
+    @property
+    def nbytes(self):
+        '''
+        Bytes held by the lineup arrays
+        '''
+        return self.offense.nbytes + self.defense.nbytes
+
+    def long(self):
+        '''
+        One row per play and lineup slot (variable o1..o11 / d1..d11, value the player id), in
+        the layout of involvement.player_involvement
+        '''
+        frames = []
+        for codes, prefix in zip([self.offense, self.defense], SIDE_COLUMNS.values()):
+            for slot in range(LINEUP_SIZE):
+                frames.append(self.plays.assign(
+                    variable = f'{prefix}{slot + 1}',
+                    value = self.ids.lookup(codes[:, slot])
+                ))
+        return pd.concat(frames, ignore_index = True)
@@ -0,0 +1,109 @@
+"""
+Player on / off field splits from a sparse player x play incidence matrix.
+
+incidence_matrix turns int32 lineup codes (see lineups.Lineups) into a scipy.sparse CSR matrix
+with a 1 where a player was on the field for a play. Any per play metric (epa, yards_gained,
+success, ...) then aggregates per player with one sparse matrix-vector product: on field sums
+are M @ metric, play counts M @ 1. Off field values are the player's team total minus the on
+field part. on_off_splits does this per season / week batch, so the matrices stay small however
+many seasons are loaded.
+
+Example:
+
+lineups = Lineups.from_pbp(api_data)
+splits = on_off_splits(lineups, api_data, ['epa','success'], side = 'offense')
+splits[['season','week','player_id','team','plays_on','epa_on','epa_off']]
+
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from warehouse.pipelines.pbp.lineups import EMPTY
+from warehouse.pipelines.pbp.aggregation import SIDE_COLUMNS
+
+def incidence_matrix(codes, n_players):
+    '''
+    CSR (players x plays) matrix, 1 where the player's code is in the play's row of codes
+    '''
+    plays, slots = np.nonzero(codes != EMPTY)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(plays)), (codes[plays, slots], plays)),
+        shape = (n_players, len(codes))
+    )
+    # A player listed twice in one lineup still counts once
+    matrix.data[:] = 1
+    return matrix
+
+def one_hot(labels):
+    '''
+    CSR (labels x rows) indicator of integer labels
+    '''
+    return sparse.csr_matrix(
+        (np.ones(len(labels)), (labels, np.arange(len(labels)))),
+        shape = (labels.max() + 1 if len(labels) else 0, len(labels))
+    )
+
+def on_off_splits(
+        lineups,
+        pbp_data,
+        metrics = ['epa'],
+        side = 'offense',
+        group_cols = ['season','week']
+):
+    '''
+    Per group (season / week by default) and player on one side of the ball: plays_on /
+    plays_off of the player's team, and for each metric its sum on / off field (<metric>_on_sum,
+    <metric>_off_sum) and mean per play with a value (<metric>_on, <metric>_off). pbp_data is the
+    frame lineups was built from (same rows, same order). A player on both teams in one group is
+    credited to the team with most of the player's snaps, and only that team's plays count on
+    either side. No rows (but the same columns) when no play has a team
+    '''
+    codes = lineups.offense if side == 'offense' else lineups.defense
+    team_col = SIDE_COLUMNS['off' if side == 'offense' else 'def']
+
+    values = pbp_data[metrics].to_numpy(dtype = np.float64)
+    valid = ~np.isnan(values)
+    # Play count first, then every metric's sum and count
+    columns = np.hstack([np.ones((len(values), 1)), np.where(valid, values, 0), valid])
+
+    groups = pbp_data.reset_index(drop = True).groupby(group_cols, observed = True).indices
+    splits = []
+    for keys, rows in groups.items():
+        teams, team_names = pd.factorize(pbp_data[team_col].iloc[rows])
+        rows, teams = rows[teams >= 0], teams[teams >= 0]
+        if len(rows) == 0:
+            continue
+
+        on_field = incidence_matrix(codes[rows], len(lineups.ids))
+        players = np.flatnonzero(on_field.getnnz(axis = 1))
+        on_field = on_field[players]
+
+        team_plays = one_hot(teams)
+        player_team = np.asarray((on_field @ team_plays.T).argmax(axis = 1)).ravel()
+        # Snaps for another team are neither on nor off field for the credited team
+        on_field = on_field.multiply(team_plays[player_team]).tocsr()
+        on = on_field @ columns[rows]
+        off = (team_plays @ columns[rows])[player_team] - on
+
+        split = pd.DataFrame({
+            'player_id': lineups.ids.lookup(players),
+            'team': np.asarray(team_names)[player_team],
+            'plays_on': on[:, 0],
+            'plays_off': off[:, 0]
+        })
+        n = len(metrics)
+        for i, metric in enumerate(metrics):
+            split[f'{metric}_on_sum'] = on[:, 1 + i]
+            split[f'{metric}_off_sum'] = off[:, 1 + i]
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                split[f'{metric}_on'] = on[:, 1 + i] / on[:, 1 + n + i]
+                split[f'{metric}_off'] = off[:, 1 + i] / off[:, 1 + n + i]
+
+        keys = keys if isinstance(keys, tuple) else (keys,)
+        splits.append(split.assign(**dict(zip(group_cols, keys)))[group_cols + list(split.columns)])
+
+    if len(splits) == 0:
+        names = [f'{metric}_{kind}' for metric in metrics for kind in ['on_sum','off_sum','on','off']]
+        return pd.DataFrame(columns = group_cols + ['player_id','team','plays_on','plays_off'] + names)
+
+    return pd.concat(splits, ignore_index = True)
@@ -0,0 +1,91 @@
+"""
+Indexed store over the melted play participation table (see involvement.player_involvement).
+
+ParticipationStore sorts the table once and keeps hash indexes from (game_id, play_id) and from
+player id to row positions, so finding a play's players or a player's plays is a dict lookup
+instead of a scan over every player-play row. The batch queries take any number of plays or
+players at once and return one frame.
+
+Example:
+
+store = ParticipationStore(player_involvement(api_data))
+store.players('2021_01_ARI_TEN', 40.0, side = 'offense')
+store.plays_for_players(['00-0032560', '00-0033873'])
+
+"""
+import numpy as np
+import pandas as pd
+
+# First letter of the melted lineup column (o1..o11, d1..d11)
+SIDES = {
+    'o': 'offense',
+    'd': 'defense'
+}
+
+class ParticipationStore():
+    '''
+
+    Player-play rows of a player_involvement frame with a side column ('offense' / 'defense')
+    and indexes by (game_id, play_id) and by player id (empty lineup slots are only reachable
+    through their play, as None)
+
+    '''
+
+    def __init__(self, player_involvement_df, side_var = 'variable', id_col = 'value'):
+
+        self.id_col = id_col
+
+        sides = player_involvement_df[side_var].astype(str).str[0].map(SIDES)
+        self.data = player_involvement_df.assign(side = sides)\
+            .sort_values(['game_id','play_id'], kind = 'stable').reset_index(drop = True)
+
+        self.play_index = self.data.groupby(['game_id','play_id'], sort = False).indices
+        self.player_index = self.data.groupby(id_col, sort = False).indices
+
+    def __len__(self):
+        return len(self.data)
+
+    def positions(self, index, keys):
+        '''
+        Row positions of every key in keys found in index, in key order
+        '''
+        found = [index[k] for k in keys if k in index]
+        return np.concatenate(found) if found else np.array([], dtype = np.int64)
+
+    def select(self, positions, side = 'both'):
+        rows = self.data.iloc[positions]
+        if side != 'both':
+            rows = rows[rows['side'] == side]
+        return rows
+
+    def players(self, game_id, play_id, side = 'offense'):
+        '''
+        Player ids on the field for one play, for side 'offense', 'defense' or 'both'
+        '''
+        return list(self.select(self.play_index.get((game_id, play_id), []), side)[self.id_col])
+
+    def plays(self, player_id, play_id = None, game_id = None):
+        '''
+        Participation rows of one player, optionally for one play / game
+        '''
+        rows = self.data.iloc[self.player_index.get(player_id, [])]
+        if play_id is not None:
+            rows = rows[rows['play_id'] == play_id]
+        if game_id is not None:
+            rows = rows[rows['game_id'] == game_id]
+        return rows
+
+    def players_for_plays(self, plays, side = 'both'):
+        '''
+        Participation rows of many plays: plays is a frame with game_id and play_id columns or an
+        iterable of (game_id, play_id) pairs
+        '''
+        if isinstance(plays, pd.DataFrame):
+            plays = zip(plays['game_id'], plays['play_id'])
+        return self.select(self.positions(self.play_index, plays), side)
+
+    def plays_for_players(self, player_ids, side = 'both'):
+        '''
+        Participation rows of many players
+        '''
+        return self.select(self.positions(self.player_index, player_ids), side)
@@ -0,0 +1,242 @@
+"""
+Global player dimension: one int32 key per GSIS player id, shared by pbp, rosters and lineups.
+
+The id <-> key dictionary (PlayerIds) is persisted next to the pbp store and only ever appended
+to, so a player keeps the same key across sessions, seasons and tables. load_pbp and load_roster
+rewrite their player id columns to these keys at ingestion (nullable Int32, <NA> where there is
+no player), which makes roster merges and player groupbys integer joins. Processes extending
+the dictionary do so under a shared lock (player_ids_lock) and write it atomically. Keys only
+mean something together with the dictionary, so its hash (player_ids_version) is part of the
+fingerprint of every loaded frame holding them.
+
+player_dimension is the deduplicated roster: name, position and other season level attributes
+indexed by (player_id, season), with one resolved row for every player and season. It is built
+once and read by index lookups (lookup_players) instead of merging the roster into plays.
+
+Example:
+
+ids = PlayerIds.load(player_ids_path())
+api_data['rusher_player_id']               # int keys
+decode_player_ids(api_data, ids)           # GSIS strings again
+players = player_dimension(roster_api_data, ids)
+names, found = lookup_players(players, api_data['rusher_player_id'], api_data['season'])
+
+"""
+import os
+import diskcache
+import numpy as np
+import pandas as pd
+from warehouse.pipelines.pbp.store import STORE_DIR
+from warehouse.utilities.feature_cache import hash_values
+
+EMPTY = -1
+
+# pbp columns holding one GSIS player id per play all end in this (passer, rusher, receiver,
+# fantasy, tackler, returner, penalty player ...). The ';' separated lineup columns are coded by
+# lineups.py instead
+PLAYER_ID_SUFFIX = '_player_id'
+
+# Roster columns kept per (player, season) in the player dimension, when present
+SEASON_ATTRIBUTES = [
+    'player_name',
+    'position',
+    'depth_chart_position',
+    'team',
+    'jersey_number',
+    'status',
+    'years_exp',
+    'height',
+    'weight'
+]
+
+def player_ids_path(store_dir = STORE_DIR):
+    return f'{store_dir}/player_ids.parquet'
+
+def player_ids_lock(store_dir = STORE_DIR):
+    '''
+    Lock shared by every process extending the dictionary in store_dir, released after expire
+    seconds if its holder dies
+    '''
+    return diskcache.Lock(
+        diskcache.Cache(f'{store_dir}/player_ids_lock'), 'player_ids', expire = 600
+    )
+
+class PlayerIds():
+    '''
+
+    Shared dictionary between player ids and int32 codes, codes handed out in order of first
+    appearance so they stay stable as more data is interned
+
+    '''
+
+    def __init__(self, ids = []):
+
+        self.index = pd.Index(list(ids), dtype = object)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Dictionary saved at path, empty if there is none yet
+        '''
+        if not os.path.exists(path):
+            return cls()
+        return cls(pd.read_parquet(path, engine = 'pyarrow')['player_id'])
+
+    def save(self, path):
+        '''
+        Write the dictionary to path through a temporary file, so readers never see a partial one
+        '''
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        tmp_path = f'{path}.tmp'
+        pd.DataFrame({'player_id': self.index.to_numpy()}).to_parquet(tmp_path, engine = 'pyarrow')
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.index)
+
+    def fingerprint(self):
+        '''
+        Hash of the ids in code order
+        '''
+        return hash_values(self.index.tolist())
+
+    def intern(self, values):
+        '''
+        Codes of values (an array of ids, None / NaN / '' for empty), adding unseen ids
+        '''
+        values = pd.Series(values, dtype = object)
+        empty = values.isnull().to_numpy() | (values == '').to_numpy()
+        codes = self.index.get_indexer(values.where(~empty))
+
+        new = pd.unique(values[(codes == EMPTY) & ~empty])
+        if len(new) > 0:
+            self.index = self.index.append(pd.Index(new, dtype = object))
+            codes = self.index.get_indexer(values.where(~empty))
+
+        return np.where(empty, EMPTY, codes).astype(np.int32)
+
+    def lookup(self, codes):
+        '''
+        Player ids of codes (any shape), None for empty slots
+        '''
+        codes = np.asarray(codes)
+        ids = self.index.to_numpy()[np.where(codes == EMPTY, 0, codes)] if len(self.index) \
+            else np.full(codes.shape, None, dtype = object)
+        return np.where(codes == EMPTY, None, ids)
+
+def player_ids_version(store_dir = STORE_DIR):
+    '''
+    Fingerprint of the dictionary persisted in store_dir
+    '''
+    return PlayerIds.load(player_ids_path(store_dir)).fingerprint()
+
+def player_keys(values, ids):
+    '''
+    Nullable Int32 keys of an array of player ids
+    '''
+    codes = ids.intern(values)
+    return pd.arrays.IntegerArray(codes, codes == EMPTY)
+
+def player_id_columns(data):
+    '''
+    Columns of data named *_player_id
+    '''
+    return [c for c in data.columns if c.endswith(PLAYER_ID_SUFFIX)]
+
+def encode_player_ids(data, ids, columns = None):
+    '''
+    data with the player id columns (every *_player_id column by default) replaced by keys from
+    ids (new ids are added)
+    '''
+    columns = player_id_columns(data) if columns is None else columns
+    present = [c for c in columns if c in data.columns]
+    return data.assign(**{c: player_keys(data[c].to_numpy(dtype = object), ids) for c in present})
+
+def decode_player_ids(data, ids, columns = None):
+    '''
+    data with keyed player columns (every *_player_id column by default) turned back into GSIS
+    ids
+    '''
+    columns = player_id_columns(data) if columns is None else columns
+    present = [c for c in columns if c in data.columns]
+    return data.assign(**{
+        c: ids.lookup(data[c].astype('Int32').fillna(EMPTY).to_numpy(dtype = np.int32))
+        for c in present
+    })
+
+def interned(encode, store_dir = STORE_DIR):
+    '''
+    encode(ids) run against the persisted dictionary, saving it when encode added ids. Returns
+    encode's result and the dictionary
+    '''
+    path = player_ids_path(store_dir)
+    ids = PlayerIds.load(path)
+    known = len(ids)
+    result = encode(ids)
+    if len(ids) == known:
+        return result, ids
+
+    # Another process may have added ids since the load, extend its dictionary instead
+    with player_ids_lock(store_dir):
+        ids = PlayerIds.load(path)
+        known = len(ids)
+        result = encode(ids)
+        if len(ids) > known:
+            ids.save(path)
+    return result, ids
+
+def intern_player_ids(data, columns = None, store_dir = STORE_DIR):
+    '''
+    encode_player_ids against the persisted dictionary, saving it when new ids were added
+    '''
+    return interned(lambda ids: encode_player_ids(data, ids, columns), store_dir)[0]
+
+def player_dimension(roster, ids = None, seasons = None):
+    '''
+    Roster attributes (player_name, position and the other SEASON_ATTRIBUTES the roster has)
+    indexed by (player_id, season), one row per player and season in seasons (every season from
+    the roster's first to its last by default). A player listed more than once in a season takes
+    the first listing, a season the player is not listed in takes the closest earlier listed
+    season, else the closest later one. With ids (a keyed roster, see load_roster) the GSIS id is
+    added as gsis_id
+    '''
+    attributes = [c for c in SEASON_ATTRIBUTES if c in roster.columns]
+    listed = roster[roster['player_id'].notnull()]\
+        .drop_duplicates(['player_id','season'])\
+        .set_index(['player_id','season'])[attributes]\
+        .sort_index()
+
+    listed_seasons = listed.index.get_level_values('season')
+    seasons = range(listed_seasons.min(), listed_seasons.max() + 1) if seasons is None else seasons
+    index = pd.MultiIndex.from_product(
+        [listed.index.get_level_values('player_id').unique(), seasons],
+        names = ['player_id','season']
+    )
+
+    # Season each (player, season) reads its attributes from
+    source = pd.Series(listed_seasons, index = listed.index).reindex(index)
+    source = source.groupby(level = 'player_id').ffill().groupby(level = 'player_id').bfill()
+    rows = listed.index.get_indexer(pd.MultiIndex.from_arrays([
+        index.get_level_values('player_id'),
+        source.to_numpy()
+    ]))
+
+    players = listed.iloc[rows].set_axis(index)
+    if ids is not None:
+        players.insert(0, 'gsis_id', ids.lookup(
+            index.get_level_values('player_id').to_numpy(dtype = np.int32)
+        ))
+
+    return players
+
+def lookup_players(players, player_ids, seasons, columns = ['player_name','position']):
+    '''
+    columns of a player_dimension for arrays of player ids and seasons, and a mask of the rows
+    that found a player. Seasons outside the dimension read its first / last season
+    '''
+    known = players.index.get_level_values('season')
+    seasons = np.clip(np.asarray(seasons), known.min(), known.max())
+    rows = players.index.get_indexer(pd.MultiIndex.from_arrays([player_ids, seasons]))
+    found = rows >= 0
+
+    return players[columns].iloc[rows[found]].reset_index(drop = True), found
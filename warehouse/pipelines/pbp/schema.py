@@ -0,0 +1,124 @@
+"""
+
+Compact dtypes for the play by play and Next Gen Stats frames, applied right after ingestion.
+
+Team, play type, drive result and game half columns become categoricals over fixed dictionaries
+(so codes line up across seasons and frames), season / week / down become small integers and
+the continuous measures float32.
+
+Note: groupbys on categorical keys need observed = True, otherwise pandas returns every
+combination of categories instead of only the groups present in the data.
+
+"""
+import warnings
+import numpy as np
+import pandas as pd
+
+# Sorted so categorical ordering matches the string ordering used in sort_values
+TEAMS = [
+    'ARI', 'ATL', 'BAL', 'BUF', 'CAR', 'CHI', 'CIN', 'CLE', 'DAL', 'DEN', 'DET', 'GB', 'HOU',
+    'IND', 'JAX', 'KC', 'LA', 'LAC', 'LV', 'MIA', 'MIN', 'NE', 'NO', 'NYG', 'NYJ', 'OAK', 'PHI',
+    'PIT', 'SD', 'SEA', 'SF', 'STL', 'TB', 'TEN', 'WAS'
+]
+
+# NGS uses the franchise abbreviation where pbp uses the nflfastR one
+NGS_TEAM_FIXES = {'LAR': 'LA'}
+
+PLAY_TYPES = [
+    'extra_point', 'field_goal', 'kickoff', 'no_play', 'pass', 'punt', 'qb_kneel', 'qb_spike',
+    'run'
+]
+
+DRIVE_RESULTS = [
+    'End of half', 'Field goal', 'Missed field goal', 'Opp safety', 'Opp touchdown', 'Punt',
+    'Safety', 'Touchdown', 'Turnover', 'Turnover on downs'
+]
+
+GAME_HALVES = ['Half1', 'Half2', 'Overtime']
+
+TEAM_COLUMNS = [
+    'posteam',
+    'defteam',
+    'home_team',
+    'away_team',
+    'td_team',
+    'side_of_field',
+    'timeout_team',
+    'penalty_team',
+    'return_team'
+]
+
+PBP_CATEGORIES = {
+    **{col: TEAMS for col in TEAM_COLUMNS},
+    'play_type': PLAY_TYPES,
+    'fixed_drive_result': DRIVE_RESULTS,
+    'game_half': GAME_HALVES
+}
+
+PBP_INTEGERS = {
+    'season': 'int16',
+    'week': 'int8',
+    # Downs are missing on non-scrimmage plays so need the nullable type
+    'down': 'Int8'
+}
+
+PBP_FLOATS = [
+    'epa',
+    'wp',
+    'wpa',
+    'yards_gained',
+    'air_yards',
+    'yards_after_catch',
+    'yardline_100',
+    'ydstogo',
+    'posteam_score',
+    'defteam_score',
+    'home_score',
+    'away_score',
+    'spread_line'
+]
+
+NGS_INTEGERS = {
+    'season': 'int16',
+    'week': 'int8'
+}
+
+def to_category(series, categories):
+    '''
+    Categorical over a fixed dictionary. Values outside it are appended rather than lost.
+    '''
+    present = series.dropna().unique()
+    unknown = sorted(str(v) for v in present if v not in set(categories))
+    if len(unknown) > 0:
+        warnings.warn(f'{series.name}: values {unknown} not in schema dictionary')
+    return pd.Categorical(series, categories = list(categories) + unknown)
+
+def apply_schema(data, categories = {}, integers = {}, floats = []):
+    '''
+    Cast the columns of data that appear in the schema, other columns are left untouched
+    '''
+    casts = {}
+    for col, values in categories.items():
+        if col in data.columns:
+            casts[col] = to_category(data[col], values)
+    for col, dtype in integers.items():
+        if col in data.columns:
+            casts[col] = data[col].astype(dtype)
+    for col in floats:
+        if col in data.columns:
+            casts[col] = data[col].astype(np.float32)
+
+    return data.assign(**casts)
+
+def apply_pbp_schema(api_data):
+    '''
+    Compact dtypes for the play by play frame
+    '''
+    return apply_schema(api_data, PBP_CATEGORIES, PBP_INTEGERS, PBP_FLOATS)
+
+def apply_ngs_schema(ngs_data):
+    '''
+    Compact dtypes for a Next Gen Stats frame, team_abbr mapped onto the pbp team dictionary
+    '''
+    ngs_data = ngs_data.assign(team_abbr = ngs_data['team_abbr'].replace(NGS_TEAM_FIXES))
+    return apply_schema(ngs_data, {'team_abbr': TEAMS}, NGS_INTEGERS)
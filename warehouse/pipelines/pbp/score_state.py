@@ -0,0 +1,70 @@
+"""
+Score state of every play, kept beside (never inside) the shared play by play frame.
+
+score_state(api_data) is the per play lead of the offense, computed once. lead_shares turns it
+into the share of each game's plays a team spent ahead by more than k points, for any list of
+margins in a single grouped pass. The leading features in performance.py are views over it.
+
+Example:
+
+shares = lead_shares(api_data, margins = [0, 3, 7, 14])
+shares[['season','week','team','leading_7']]
+
+"""
+import numpy as np
+import pandas as pd
+from warehouse.utilities.feature_cache import feature_cache as cache
+
+LEAD_MARGINS = [0, 3, 7, 14]
+
+@cache.memoize()
+def score_state(api_data):
+    '''
+    Per play season, week, game_id, posteam, defteam and lead (posteam_score - defteam_score)
+    '''
+    return pd.DataFrame({
+        'season': api_data['season'],
+        'week': api_data['week'],
+        'game_id': api_data['game_id'],
+        'posteam': api_data['posteam'],
+        'defteam': api_data['defteam'],
+        'lead': (api_data['posteam_score'] - api_data['defteam_score']).to_numpy(dtype = np.float64)
+    })
+
+def ahead(lead, margin, side):
+    '''
+    Plays where the offense (side = 'off') or defense (side = 'def') led by more than margin.
+    At margin 0 a tie counts for the team in possession.
+    '''
+    if side == 'def':
+        return lead < -margin
+    return (lead > margin) | ((margin == 0) & (lead == 0))
+
+@cache.memoize()
+def lead_shares(api_data, margins = LEAD_MARGINS):
+    '''
+    One row per (season, week, team) with an offensive snap that week: leading_<k> is the share
+    of all plays in the team's game during which it led by more than k. Sorted by season / team /
+    week like aggregation.team_week_base.
+    '''
+    state = score_state(api_data)
+    lead = state['lead'].to_numpy()
+    game_plays = state.groupby('game_id', observed=True)['game_id'].transform('size').to_numpy()
+
+    # Each play once from the offense's side and once from the defense's, then a single groupby
+    sides = [
+        pd.DataFrame({
+            'season': state['season'],
+            'week': state['week'],
+            'team': state[team_col],
+            'snaps': np.full(len(state), side == 'off'),
+            **{f'leading_{k}': ahead(lead, k, side) / game_plays for k in margins}
+        })
+        for side, team_col in [('off','posteam'), ('def','defteam')]
+    ]
+    shares = pd.concat(sides, ignore_index = True)\
+        .groupby(['season','week','team'], as_index=False, observed=True).sum()
+
+    shares = shares[shares['snaps'] > 0].drop(['snaps'], axis = 1)
+
+    return shares.sort_values(['season','team','week']).reset_index(drop=True)
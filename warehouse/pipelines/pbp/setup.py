@@ -1,10 +1,172 @@
-
+import pandas as pd
 import nfl_data_py as nflreadr
+from warehouse.pipelines.pbp import schema, players
+from warehouse.pipelines.pbp.store import PartitionedStore, STORE_DIR
+from warehouse.pipelines.pbp.schema import apply_pbp_schema, apply_ngs_schema
+from warehouse.pipelines.pbp.players import intern_player_ids, player_ids_version
+from warehouse.utilities.feature_cache import register_fingerprint, fingerprint, hash_values, \
+    module_version
+
+NGS_TYPES = ['rushing','receiving','passing']
+
+# Columns always loaded: team / week keys for every feature plus game_outcomes requirements
+CORE_PBP_COLUMNS = [
+    'season',
+    'week',
+    'game_id',
+    'play_id',
+    'posteam',
+    'defteam',
+    'home_team',
+    'away_team',
+    'home_score',
+    'away_score',
+    'spread_line'
+]
+
+# Team / week keys needed to attach defenses to the NGS frames
+SCHEDULE_COLUMNS = ['season','week','posteam','defteam']
+
+def loader_version():
+    '''
+    Hash of the schema and player key code applied after loading, part of every loaded frame's
+    fingerprint so a dtype or id change does not serve features cached from the old frames
+    '''
+    return hash_values(module_version(schema), module_version(players))
+
+def load_pbp(
+        only_regular_season = True,
+        starting_year = 2016,
+        ending_year = 2022,
+        store_dir = STORE_DIR,
+        offline = False,
+        columns = None
+):
+    '''
+    Play by play data for the given seasons, read from the local partitioned store (see store.py)
+    with only seasons missing from the store downloaded, and cast to the compact dtypes in
+    schema.py. offline = True never touches the API. columns limits the frame to those columns
+    (see catalog.required_pbp_columns), None loads everything. Player id columns hold int32
+    player keys (see players.py).
+    The frame is registered with a fingerprint built from the store's partition hashes and the
+    player dictionary, the feature cache keys on that instead of hashing the plays.
+    '''
+    store = PartitionedStore('pbp', store_dir)
+    seasons = range(starting_year, ending_year+1)
+    api_data = store.load(
+        seasons,
+        fetch = nflreadr.import_pbp_data,
+        columns = columns,
+        offline = offline
+    )
+    api_data = apply_pbp_schema(api_data).assign(play_counter = 1)
+    api_data = intern_player_ids(api_data, store_dir = store_dir)
+
+    if only_regular_season:
+        api_data = api_data[api_data['week']<=18]
+
+    return register_fingerprint(
+        api_data,
+        hash_values(
+            store.fingerprint(seasons, columns),
+            only_regular_season,
+            loader_version(),
+            player_ids_version(store_dir)
+        )
+    )
+
+def game_schedule(api_data):
+    '''
+    One row per (season, week, posteam, defteam) in the play by play data
+    '''
+    return api_data[SCHEDULE_COLUMNS].drop_duplicates().reset_index(drop=True)
+
+def select_games(data, teams = None, max_week = None, team_cols = ['home_team','away_team']):
+    '''
+    Rows of data from games involving one of teams (every game if None) played up to max_week
+    (every week if None). Whole games are kept, so the rows of those teams are complete
+    '''
+    keep = pd.Series(True, index = data.index)
+    if teams is not None:
+        keep &= data[team_cols].isin(list(teams)).any(axis = 1)
+    if max_week is not None:
+        keep &= data['week'] <= max_week
+    return data if keep.all() else data[keep]
+
+def primary_passers(stats):
+    '''
+    True on the passer with the most attempts in each (season, week, team_abbr) of an NGS passing
+    table. Nobody is flagged when the most attempts are tied
+    '''
+    return stats.groupby(['season','week','team_abbr'], observed=True)['attempts']\
+        .rank(ascending=False) == 1
+
+def load_ngs(
+        stat_type,
+        schedule,
+        starting_year = 2016,
+        ending_year = 2022,
+        store_dir = STORE_DIR,
+        offline = False
+):
+    '''
+    One Next Gen Stats table ('rushing', 'receiving' or 'passing') with season summary rows
+    dropped and the opposing defense (defteam) attached from schedule (see game_schedule). The
+    passing table also gets primary_passer, flagging each team-week's primary passer once for
+    every feature built on it (see primary_passers)
+    '''
+    store = PartitionedStore(f'ngs_{stat_type}', store_dir)
+    seasons = range(starting_year, ending_year+1)
+    stats = store.load(
+        seasons,
+        fetch = lambda years: nflreadr.import_ngs_data(stat_type, years),
+        offline = offline
+    )
+    stats = apply_ngs_schema(stats[stats['week'] > 0])
+
+    # Adding defenses
+    stats = stats.merge(schedule, how='left',left_on=['season','week', 'team_abbr'],
+                        right_on=['season','week', 'posteam']).drop(['posteam'], axis=1)
+    if stat_type == 'passing':
+        stats['primary_passer'] = primary_passers(stats)
+
+    return register_fingerprint(
+        stats,
+        hash_values(store.fingerprint(seasons), fingerprint(schedule), loader_version())
+    )
+
+def load_roster(
+        starting_year = 2016,
+        ending_year = 2022,
+        store_dir = STORE_DIR,
+        offline = False
+):
+    '''
+    Seasonal rosters (player_id, player_name, position, ...) for the given seasons, player_id
+    holding the same int32 player keys as the pbp player columns (see players.py). Read from the
+    local store like load_pbp (one partition per season), so offline = True never touches the API
+    '''
+    store = PartitionedStore('rosters', store_dir, weekly = False)
+    seasons = range(starting_year, ending_year+1)
+    roster = store.load(
+        seasons,
+        fetch = lambda years: nflreadr.import_rosters(years = years),
+        offline = offline
+    )
+    roster = intern_player_ids(roster, ['player_id'], store_dir = store_dir)
+
+    return register_fingerprint(
+        roster,
+        hash_values(store.fingerprint(seasons), loader_version(), player_ids_version(store_dir))
+    )
 
 def setup_pbp(
         only_regular_season = True,
         starting_year = 2016,
-        ending_year = 2022
+        ending_year = 2022,
+        store_dir = STORE_DIR,
+        offline = False,
+        columns = None
 ):
     '''
     Function to run some preprocessing, import api data, and return useful dataframes
@@ -15,6 +177,8 @@ def setup_pbp(
         'passing':<df>
     }
     api_data
+    Eagerly loads everything through load_pbp / load_ngs, config.Configuration loads the same
+    frames lazily on first access.
     Example call:
 
     api_data, ngs = setup_pbp()
@@ -22,22 +186,50 @@ def setup_pbp(
         ngs['passing']
     '''
 
-    years_included = range(starting_year, ending_year+1)
-    api_data = nflreadr.import_pbp_data(years_included)
-    api_data = api_data.assign(play_counter = 1)
+    api_data = load_pbp(
+        only_regular_season = only_regular_season,
+        starting_year = starting_year,
+        ending_year = ending_year,
+        store_dir = store_dir,
+        offline = offline,
+        columns = columns
+    )
+    schedule = game_schedule(api_data)
+    ngs = {pt: load_ngs(
+        pt,
+        schedule,
+        starting_year = starting_year,
+        ending_year = ending_year,
+        store_dir = store_dir,
+        offline = offline
+    ) for pt in NGS_TYPES}
 
-    if only_regular_season:
-        api_data = api_data[api_data['week']<=18]
+    return api_data, ngs
 
-    ngs = {pt: nflreadr.import_ngs_data(pt) for pt in ['rushing','receiving','passing']}
-    ngs = {key: value[value['week'] > 0] for key, value in ngs.items()}
-    for pt, stats in ngs.items():
-        ngs[pt]['team_abbr'] = ngs[pt]['team_abbr'].replace(['LAR'], 'LA')
+def ingest_week(
+        season,
+        week,
+        store_dir = STORE_DIR
+):
+    '''
+    Incremental (in-season) update: pull a newly completed week into the local store.
+    nflverse publishes whole season files only, so the downloaded season is stored as a whole
+    (its manifest entry then describes what is on disk) and that week's pbp and NGS partitions
+    are replaced even where the season was already stored as complete.
 
-    # Adding defenses
-    getting_schedule = api_data[['season','week','posteam','defteam']].drop_duplicates().reset_index(drop=True)
-    ngs = {key: value.merge(getting_schedule, how='left',left_on=['season','week', 'team_abbr'],
-                         right_on=['season','week', 'posteam']).drop(['posteam'], axis=1)
-                         for key, value in ngs.items()}
+    Example call (Tuesday refresh):
 
-    return api_data, ngs
+    ingest_week(2023, 5)
+    api_data, ngs = setup_pbp(starting_year = 2023, ending_year = 2023, offline = True)
+    '''
+    PartitionedStore('pbp', store_dir).write(
+        nflreadr.import_pbp_data([season]),
+        seasons = [season],
+        replace = [(season, week)]
+    )
+    for pt in NGS_TYPES:
+        PartitionedStore(f'ngs_{pt}', store_dir).write(
+            nflreadr.import_ngs_data(pt, [season]),
+            seasons = [season],
+            replace = [(season, week)]
+        )
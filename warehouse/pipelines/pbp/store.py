@@ -0,0 +1,177 @@
+"""
+
+Local on-disk store for play by play and Next Gen Stats data.
+
+Each table is kept as one Parquet file per (season, week) partition plus a manifest recording
+which seasons have been pulled from the API and a content hash per partition (the basis of the
+feature cache fingerprints, see utilities/feature_cache.py). setup_pbp reads from here first and
+only goes to nfl_data_py for seasons that are missing (or still in progress).
+
+cache/pbp_store/
+    pbp/
+        manifest.json
+        season=2021/week=01.parquet
+        ...
+    ngs_passing/
+        ...
+    rosters/
+        season=2021/week=00.parquet     (tables without weeks: one partition per season)
+
+"""
+import os
+import json
+import hashlib
+import datetime
+import pandas as pd
+from warehouse.utilities.feature_cache import hash_frame, hash_values
+
+REPO_NAME = 'sewer-nfl'
+CWD = str(os.getcwd())
+REPO_DIR = CWD[:CWD.find(REPO_NAME)+len(REPO_NAME)]
+STORE_DIR = f'{REPO_DIR}/cache/pbp_store'
+
+def current_season(today = None):
+    '''
+    NFL season in progress on a given date (seasons run September through February)
+    '''
+    today = today or datetime.date.today()
+    return today.year if today.month >= 9 else today.year - 1
+
+class PartitionedStore():
+    '''
+
+    One table (pbp, ngs_passing, ...) stored as season/week partitioned Parquet files, or with
+    weekly = False (rosters) one file per season stored as week 0
+
+    Example:
+
+    store = PartitionedStore('pbp')
+    api_data = store.load(range(2016, 2023), fetch = nflreadr.import_pbp_data)
+
+    '''
+
+    def __init__(self, table, root = STORE_DIR, weekly = True):
+
+        self.table = table
+        self.weekly = weekly
+        self.path = f'{root}/{table}'
+        self.manifest_path = f'{self.path}/manifest.json'
+
+    def partition_path(self, season, week):
+        return f'{self.path}/season={int(season)}/week={int(week):02d}.parquet'
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'seasons': {}, 'partitions': {}}
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest):
+        os.makedirs(self.path, exist_ok = True)
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent = 1, sort_keys = True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def partitions(self, seasons = None):
+        '''
+        Sorted (season, week) partitions currently on disk, optionally limited to seasons
+        '''
+        keys = [tuple(int(x) for x in key.split('/')) for key in self.read_manifest()['partitions']]
+        if seasons is not None:
+            seasons = set(int(s) for s in seasons)
+            keys = [k for k in keys if k[0] in seasons]
+        return sorted(keys)
+
+    def missing_seasons(self, seasons):
+        '''
+        Seasons that have never been pulled, or were pulled before the season was over
+        '''
+        stored = self.read_manifest()['seasons']
+        return [s for s in seasons if not stored.get(str(s), {}).get('complete', False)]
+
+    def write(self, data, seasons = None, overwrite = False, replace = ()):
+        '''
+        Write one file per (season, week) in data and record the seasons as pulled, so data
+        should hold the whole of each season. Partitions of completed seasons already on disk
+        are kept unless overwrite is set or they are listed in replace ((season, week) pairs),
+        those of a season still in progress are rewritten since late games / stat corrections
+        land there.
+        '''
+        manifest = self.read_manifest()
+        data_seasons = set(data['season'].unique()) if len(data) > 0 else set()
+        seasons = sorted(data_seasons | set(seasons or []))
+
+        if len(data) == 0:
+            parts = []
+        elif self.weekly:
+            parts = data.groupby(['season','week'])
+        else:
+            parts = (((season, 0), part) for season, part in data.groupby('season'))
+
+        replace = set((int(s), int(w)) for s, w in replace)
+        written = []
+        for (season, week), part in parts:
+            key = f'{int(season)}/{int(week)}'
+            path = self.partition_path(season, week)
+            complete = manifest['seasons'].get(str(int(season)), {}).get('complete', False)
+            if key in manifest['partitions'] and os.path.exists(path) and complete \
+                and not overwrite and (int(season), int(week)) not in replace:
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            part.reset_index(drop = True).to_parquet(path, engine = 'pyarrow', index = False)
+            manifest['partitions'][key] = {'rows': int(len(part)), 'hash': hash_frame(part)}
+            written.append((int(season), int(week)))
+
+        for season in seasons:
+            manifest['seasons'][str(int(season))] = {
+                'complete': int(season) < current_season(),
+                'pulled': datetime.datetime.now().isoformat(timespec = 'seconds')
+            }
+        self.write_manifest(manifest)
+
+        return written
+
+    def partition_hash(self, season, week, manifest):
+        '''
+        Content hash recorded at ingestion, partitions written before hashes were recorded fall
+        back to a hash of the file
+        '''
+        entry = manifest['partitions'].get(f'{int(season)}/{int(week)}', {})
+        if 'hash' in entry:
+            return entry['hash']
+        with open(self.partition_path(season, week), 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def fingerprint(self, seasons, columns = None):
+        '''
+        Fingerprint of read(seasons, columns) built from the partition hashes, without reading data
+        '''
+        manifest = self.read_manifest()
+        partitions = [
+            (s, w, self.partition_hash(s, w, manifest)) for s, w in self.partitions(seasons)
+        ]
+        return hash_values(self.table, partitions, columns)
+
+    def read(self, seasons, columns = None):
+        '''
+        Concatenate all stored partitions for the given seasons
+        '''
+        files = [self.partition_path(s, w) for s, w in self.partitions(seasons)]
+        if len(files) == 0:
+            return pd.DataFrame(columns = columns)
+        return pd.concat(
+            [pd.read_parquet(f, engine = 'pyarrow', columns = columns) for f in files],
+            ignore_index = True
+        )
+
+    def load(self, seasons, fetch, columns = None, offline = False):
+        '''
+        Read seasons from disk, first pulling any missing seasons with fetch(list_of_seasons)
+        '''
+        seasons = [int(s) for s in seasons]
+        missing = self.missing_seasons(seasons)
+        if len(missing) > 0 and not offline:
+            self.write(fetch(missing), seasons = missing)
+
+        return self.read(seasons, columns = columns)
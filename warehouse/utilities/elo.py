@@ -1,4 +1,172 @@
+"""
+Sequential ELO ratings for offensive players against defenses (calculate_elo_metric).
+
+Rows are walked in order_cols order; each offensive entity (off_lookup_values) and defensive
+entity (def_lookup_values) carries its latest rating forward. The walk runs in elo_kernel over
+integer entity ids and plain arrays, compiled with numba when it is installed and as a Python
+loop over lists otherwise, both with the same float arithmetic as elo_adj.
+
+With week_synchronous = True every matchup of a week (one value of order_cols, (season, week)
+by default) is rated from the ratings before that week and each entity's adjustments are summed
+at the end of it, instead of rows in the same week seeing each other's updates. Each week is then
+one vectorised step.
+
+elo_sweep runs a grid of parameter combinations together, the rating caches holding one column
+per combination, so tuning costs about one walk instead of one per combination.
+
+Example:
+
+elo_df = calculate_elo_metric(rushing_off_epa, rushing_def_epa, elo_multiplier = 5)
+elo_df[['season','week','rusher_player_id','off_elo','def_elo']]
+
+grid = elo_grid({'elo_multiplier': [3, 5, 7], 'elo_power': [1.5, 1.7, 2]})
+matchups, ratings, summary = elo_sweep(rushing_off_epa, rushing_def_epa, grid)
+summary.sort_values('edge_corr', ascending = False)
+
+"""
 import math as m
+import inspect
+import itertools
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Parameters that elo_sweep varies
+ELO_PARAMS = ['elo_multiplier','elo_power','elo_season_reset','elo_base']
+
+def jit(func):
+    '''
+    numba compiled func when numba is installed, func itself otherwise
+    '''
+    return njit(cache = True)(func) if njit is not None else func
+
+@jit
+def elo_adj(elo_1, elo_2, z_perf, multiplier_units = 10, power = 2):
+    # How much would I win / lose betting on offense?
+    odds = elo_2 / elo_1
+    win = 1 if z_perf > 0 else 0
+    if win == 1:
+        ret = (odds * multiplier_units)**power
+    else:
+        ret = -1 * (multiplier_units)**power
+    off_ret = ret * abs(z_perf)
+    # How much would I win / lose taking a bet on the defense?
+    odds = elo_1 / elo_2
+    win = 1 if z_perf < 0 else 0
+    if win == 1:
+        ret = -1 * (odds * multiplier_units)**power
+    else:
+        ret = (multiplier_units)**power
+    def_ret = ret * abs(z_perf)
+    return (off_ret + def_ret) / 2
+
+@jit
+def elo_kernel(
+    off_entity,
+    def_entity,
+    off_first,
+    def_first,
+    off_perf,
+    def_perf,
+    off_cache,
+    def_cache,
+    off_elo,
+    def_elo,
+    off_elo_next,
+    def_elo_next,
+    elo_multiplier,
+    elo_power,
+    elo_season_reset,
+    elo_base
+):
+    '''
+    Rating walk over rows already in order. Row i reads the cached ratings of its entities
+    (off_entity[i], def_entity[i]), elo_base when there is none or it is NaN, and writes
+    off_elo / def_elo and the updated off_elo_next / def_elo_next, which it caches. The cache
+    arrays start as NaN, one slot per entity, and are updated in place like the outputs
+    '''
+    for i in range(len(off_entity)):
+        off_elo_val = off_cache[off_entity[i]]
+        if m.isnan(off_elo_val):
+            off_elo_val = elo_base
+        def_elo_val = def_cache[def_entity[i]]
+        if m.isnan(def_elo_val):
+            def_elo_val = elo_base
+        # Reset ELO towards base if first appearance of season
+        if def_first[i]:
+            def_elo_val = (def_elo_val - elo_base) * elo_season_reset + elo_base
+        if off_first[i]:
+            off_elo_val = (off_elo_val - elo_base) * elo_season_reset + elo_base
+
+        off_elo[i] = off_elo_val
+        def_elo[i] = def_elo_val
+        off_elo_next[i] = off_elo_val + elo_adj(
+            off_elo_val, def_elo_val, off_perf[i], elo_multiplier, elo_power
+        )
+        def_elo_next[i] = def_elo_val + elo_adj(
+            def_elo_val, off_elo_val, def_perf[i], elo_multiplier, elo_power
+        )
+
+        off_cache[off_entity[i]] = off_elo_next[i]
+        def_cache[def_entity[i]] = def_elo_next[i]
+
+@jit
+def elo_sweep_kernel(
+    off_entity,
+    def_entity,
+    off_first,
+    def_first,
+    off_perf,
+    def_perf,
+    off_cache,
+    def_cache,
+    off_elo,
+    def_elo,
+    off_elo_next,
+    def_elo_next,
+    elo_multiplier,
+    elo_power,
+    elo_season_reset,
+    elo_base
+):
+    '''
+    elo_kernel for K parameter combinations at once: the parameters are (K,) arrays, the caches
+    (entities x K) and the outputs (rows x K), so each row advances every combination together
+    '''
+    for i in range(len(off_entity)):
+        off_elo_val = off_cache[off_entity[i]]
+        off_elo_val = np.where(np.isnan(off_elo_val), elo_base, off_elo_val)
+        def_elo_val = def_cache[def_entity[i]]
+        def_elo_val = np.where(np.isnan(def_elo_val), elo_base, def_elo_val)
+        # Reset ELO towards base if first appearance of season
+        if def_first[i]:
+            def_elo_val = (def_elo_val - elo_base) * elo_season_reset + elo_base
+        if off_first[i]:
+            off_elo_val = (off_elo_val - elo_base) * elo_season_reset + elo_base
+
+        off_elo[i] = off_elo_val
+        def_elo[i] = def_elo_val
+        off_elo_next[i] = off_elo_val + elo_adj(
+            off_elo_val, def_elo_val, off_perf[i], elo_multiplier, elo_power
+        )
+        def_elo_next[i] = def_elo_val + elo_adj(
+            def_elo_val, off_elo_val, def_perf[i], elo_multiplier, elo_power
+        )
+
+        off_cache[off_entity[i]] = off_elo_next[i]
+        def_cache[def_entity[i]] = def_elo_next[i]
+
+def entity_ids(data, lookup_values):
+    '''
+    Integer id per row of data for its combination of lookup_values, missing values included
+    '''
+    return data.groupby(lookup_values, sort = False, dropna = False, observed = True)\
+        .ngroup().to_numpy()
+
 
 # Example of input_off_data used with default values below
 # |------|--------|------|---------|---------|----------|------------------|--------------------------|-------------------------|
@@ -15,6 +183,120 @@ import math as m
 # |    0 |   2021 |    1 | ARI     | TEN     | QB       |    -0.3047991929363788 |
 
 
+def elo_matchups(
+    input_off_data,
+    input_def_data,
+    order_cols = ['season','week'],
+    off_gb_cols = ['posteam','defteam','position','rusher_player_id','player_name'],
+    def_gb_cols = ['posteam','defteam','position']
+):
+    '''
+    Offense rows joined to their defense on the smaller grouping, in the order ratings are walked
+    '''
+    min_gb_cols = def_gb_cols if len(def_gb_cols) <= len(off_gb_cols) else off_gb_cols
+
+    # Join on smallest grouping
+    elo_df = input_off_data.merge(
+        input_def_data,
+        on = order_cols + min_gb_cols,
+        how = 'left' if len(def_gb_cols) <= len(off_gb_cols) else 'right'
+    )
+    return elo_df.sort_values(by = order_cols)
+
+def order_groups(elo_df, order_cols = ['season','week']):
+    '''
+    Row positions of every order_cols value of ordered matchups (see elo_matchups), in walk order
+    '''
+    return pd.Series(np.arange(len(elo_df))).groupby(
+        [elo_df[col].to_numpy() for col in order_cols], sort = True
+    ).indices
+
+def kernel_inputs(elo_df, off_lookup_values, def_lookup_values, off_perf_col, def_perf_col):
+    '''
+    Entity ids, first appearance flags and performance arrays of ordered matchups
+    '''
+    return [
+        entity_ids(elo_df, off_lookup_values),
+        entity_ids(elo_df, def_lookup_values),
+        (elo_df['off_appearance'] == 1).to_numpy(),
+        (elo_df['def_appearance'] == 1).to_numpy(),
+        elo_df[off_perf_col].to_numpy(dtype = np.float64),
+        elo_df[def_perf_col].to_numpy(dtype = np.float64)
+    ]
+
+def entity_cache(entity, k = None):
+    '''
+    NaN ratings for every entity (entities x k when k is given)
+    '''
+    n = entity.max() + 1 if len(entity) else 0
+    return np.full(n if k is None else (n, k), np.nan)
+
+def run_elo_kernel(inputs, off_cache, def_cache, *params):
+    '''
+    elo_kernel over kernel_inputs starting from rating caches (NaN for no rating). Returns the
+    off_elo, def_elo, off_elo_next and def_elo_next arrays and the updated caches
+    '''
+    arrays = list(inputs) + [off_cache.copy(), def_cache.copy()]
+    outputs = [np.empty(len(inputs[0])) for _ in range(4)]
+    if njit is None:
+        # Python floats and lists are much faster than NumPy scalars in a plain loop
+        arrays = [a.tolist() for a in arrays]
+        outputs = [o.tolist() for o in outputs]
+    elo_kernel(*arrays, *outputs, *params)
+
+    return [np.asarray(a, dtype = np.float64) for a in outputs + arrays[6:]]
+
+def elo_adj_matchups(elo_1, elo_2, z_perf, multiplier_units = 10, power = 2):
+    '''
+    elo_adj over arrays of matchups
+    '''
+    odds = elo_2 / elo_1
+    off_ret = np.where(z_perf > 0, (odds * multiplier_units)**power, -1 * (multiplier_units)**power)\
+        * np.abs(z_perf)
+    odds = elo_1 / elo_2
+    def_ret = np.where(z_perf < 0, -1 * (odds * multiplier_units)**power, (multiplier_units)**power)\
+        * np.abs(z_perf)
+    return (off_ret + def_ret) / 2
+
+def run_elo_weeks(inputs, weeks, off_cache, def_cache, *params):
+    '''
+    Week-synchronous walk over kernel_inputs: every matchup of a week (weeks maps each week to
+    its rows, see order_groups) reads the ratings from before the week, and each entity's adjustments from all of
+    its matchups are summed and applied once the week is over. Returns off_elo, def_elo (pre-week
+    ratings after season resets), off_elo_next, def_elo_next (the entity's rating after the
+    week) and the updated caches
+    '''
+    off_entity, def_entity, off_first, def_first, off_perf, def_perf = inputs
+    elo_multiplier, elo_power, elo_season_reset, elo_base = params
+    off_cache, def_cache = off_cache.copy(), def_cache.copy()
+    outputs = [np.empty(len(off_entity)) for _ in range(4)]
+
+    for rows in weeks.values():
+        off_id, def_id = off_entity[rows], def_entity[rows]
+        off_elo_val = np.where(np.isnan(off_cache[off_id]), elo_base, off_cache[off_id])
+        def_elo_val = np.where(np.isnan(def_cache[def_id]), elo_base, def_cache[def_id])
+        # Reset ELO towards base if first appearance of season
+        off_elo_val = np.where(off_first[rows], (off_elo_val - elo_base) * elo_season_reset + elo_base,
+            off_elo_val)
+        def_elo_val = np.where(def_first[rows], (def_elo_val - elo_base) * elo_season_reset + elo_base,
+            def_elo_val)
+
+        off_adj = elo_adj_matchups(off_elo_val, def_elo_val, off_perf[rows], elo_multiplier, elo_power)
+        def_adj = elo_adj_matchups(def_elo_val, off_elo_val, def_perf[rows], elo_multiplier, elo_power)
+
+        # Pre-week rating plus the sum of the week's adjustments, per entity
+        for cache, ids, start, adj in [
+            (off_cache, off_id, off_elo_val, off_adj),
+            (def_cache, def_id, def_elo_val, def_adj)
+        ]:
+            cache[ids] = start
+            cache[ids] += np.bincount(ids, weights = adj, minlength = len(cache))[ids]
+
+        outputs[0][rows], outputs[1][rows] = off_elo_val, def_elo_val
+        outputs[2][rows], outputs[3][rows] = off_cache[off_id], def_cache[def_id]
+
+    return outputs + [off_cache, def_cache]
+
 def calculate_elo_metric(
     input_off_data,
     input_def_data,
@@ -35,96 +317,83 @@ def calculate_elo_metric(
     elo_multiplier = 3,
     elo_power = 2,
     elo_season_reset = 0.5,
-    elo_base = 2000 # Arbitrary value
+    elo_base = 2000, # Arbitrary value
+    # Rate every matchup of a week from pre-week ratings, see run_elo_weeks
+    week_synchronous = False
 ):
-    off_df = input_off_data
-    def_df = input_def_data
+    elo_df = elo_matchups(input_off_data, input_def_data, order_cols, off_gb_cols, def_gb_cols)
+    inputs = kernel_inputs(elo_df, off_lookup_values, def_lookup_values, off_perf_col, def_perf_col)
 
-    min_gb_cols = def_gb_cols if len(def_gb_cols) <= len(off_gb_cols) else off_gb_cols
+    params = [elo_multiplier, elo_power, elo_season_reset, elo_base]
+    caches = [entity_cache(inputs[0]), entity_cache(inputs[1])]
+    if week_synchronous:
+        outputs = run_elo_weeks(inputs, order_groups(elo_df, order_cols), *caches, *params)[:4]
+    else:
+        outputs = run_elo_kernel(inputs, *caches, *params)[:4]
 
-    # Join on smallest grouping
-    elo_df = off_df.merge(
-        def_df,
-        on = order_cols + min_gb_cols,
-        how = 'left' if len(def_gb_cols) <= len(off_gb_cols) else 'right'
-    )
-    elo_df['off_elo'], elo_df['def_elo'] = None, None
-    elo_df['off_elo_next'], elo_df['def_elo_next'] = None, None
-
-    caching_dict = {}
-
-    def elo_adj(elo_1, elo_2, z_perf ,multiplier_units = 10, power = 2):
-        # How much would I win / lose betting on offense?
-        odds = elo_2 / elo_1
-        win = 1 if z_perf > 0 else 0
-        if win == 1:
-            ret = (odds * multiplier_units)**power
-        else:
-            ret = -1 * (multiplier_units)**power
-        off_ret = ret * abs(z_perf)
-        # How much would I win / lose taking a bet on the defense?
-        odds = elo_1 / elo_2
-        win = 1 if z_perf < 0 else 0
-        if win == 1:
-            ret = -1 * (odds * multiplier_units)**power
-        else:
-            ret = (multiplier_units)**power
-        def_ret = ret * abs(z_perf)
-        return (off_ret + def_ret) / 2
-
-    elo_df = elo_df.sort_values(by = order_cols)
-
-    for index, row in elo_df.iterrows():
-        off_elo_val = elo_base
-        def_elo_val = elo_base
-        # Check if elo is none
-        if row['off_elo'] is None:
-            off_tup = tuple([row[key] for key in off_lookup_values] + ['off'])
-            # Check if tup in keys of caching_dict
-            found = off_tup in caching_dict.keys()
-            # If it is found in keys, set elo_val to the value
-            if found:
-                off_elo_val = caching_dict[off_tup] if not m.isnan(caching_dict[off_tup]) \
-                    else elo_base
-        if row['def_elo'] is None:
-            def_tup = tuple([row[key] for key in def_lookup_values] + ['def'])
-            # Check if tup in keys of caching_dict
-            found = def_tup in caching_dict.keys()
-            # If it is found in keys, set elo_val to the value
-            if found:
-                def_elo_val = caching_dict[def_tup] if not m.isnan(caching_dict[def_tup]) \
-                    else elo_base
-        # Reset ELO towards base if first appearance of season
-        if row['def_appearance'] == 1: def_elo_val = (def_elo_val - elo_base) * elo_season_reset + \
-            elo_base
-        if row['off_appearance'] == 1: off_elo_val = (off_elo_val - elo_base) * elo_season_reset + \
-            elo_base
-        # Calculate ELO to update
-        off_elo_val_next = off_elo_val + elo_adj(
-            off_elo_val,
-            def_elo_val,
-            z_perf = row[off_perf_col],
-            multiplier_units=elo_multiplier,
-            power=elo_power
-        )
-        def_elo_val_next = def_elo_val + elo_adj(
-            def_elo_val,
-            off_elo_val,
-            z_perf = row[def_perf_col],
-            multiplier_units=elo_multiplier,
-            power=elo_power
-        )
+    for col, values in zip(['off_elo','def_elo','off_elo_next','def_elo_next'], outputs):
+        elo_df[col] = values
 
-        elo_df.at[index, 'off_elo'] = off_elo_val
-        elo_df.at[index, 'def_elo'] = def_elo_val
-        elo_df.at[index, 'off_elo_next'] = off_elo_val_next
-        elo_df.at[index, 'def_elo_next'] = def_elo_val_next
-
-        # Store off and defensive values in caching
-        caching_dict[off_tup] = off_elo_val_next
-        caching_dict[def_tup] = def_elo_val_next
     return elo_df
 
+def elo_grid(params):
+    '''
+    Every combination of a dict of parameter lists (elo_multiplier, elo_power, elo_season_reset,
+    elo_base), calculate_elo_metric's default for parameters left out
+    '''
+    signature = inspect.signature(calculate_elo_metric).parameters
+    values = [params.get(p, [signature[p].default]) for p in ELO_PARAMS]
+    return pd.DataFrame(list(itertools.product(*values)), columns = ELO_PARAMS)
 
+def elo_sweep(
+    input_off_data,
+    input_def_data,
+    grid,
+    order_cols = ['season','week'],
+    off_gb_cols = ['posteam','defteam','position','rusher_player_id','player_name'],
+    def_gb_cols = ['posteam','defteam','position'],
+    off_lookup_values = ['position','rusher_player_id'],
+    def_lookup_values = ['position','defteam'],
+    off_perf_col = 'z_epa_x',
+    def_perf_col = 'z_epa_y'
+):
+    '''
+    calculate_elo_metric for every row of grid (see elo_grid) in one walk over the matchups.
+    Returns the ordered matchups without ratings, a dict of (K x rows) rating arrays (off_elo,
+    def_elo, off_elo_next, def_elo_next; row k is what calculate_elo_metric returns with grid
+    row k) and grid with a score per combination: edge_corr, the correlation of the pre-game
+    edge (off_elo - def_elo) with off_perf_col, and edge_accuracy, the share of rows where the
+    edge has the sign of off_perf_col. Ratings match calculate_elo_metric up to rounding, NumPy's
+    vectorised power can differ from the scalar one in the last bit
+    '''
+    elo_df = elo_matchups(input_off_data, input_def_data, order_cols, off_gb_cols, def_gb_cols)
+    inputs = kernel_inputs(elo_df, off_lookup_values, def_lookup_values, off_perf_col, def_perf_col)
+
+    k = len(grid)
+    params = [grid[p].to_numpy(dtype = np.float64) for p in ELO_PARAMS]
+    outputs = [np.empty((len(elo_df), k)) for _ in range(4)]
+    # Combinations whose ratings diverge (where calculate_elo_metric raises) turn NaN / inf
+    with np.errstate(all = 'ignore'):
+        elo_sweep_kernel(
+            *inputs, entity_cache(inputs[0], k), entity_cache(inputs[1], k), *outputs, *params
+        )
+    ratings = dict(zip(
+        ['off_elo','def_elo','off_elo_next','def_elo_next'],
+        [np.ascontiguousarray(o.T) for o in outputs]
+    ))
 
+    # Scores over rows with an offensive result
+    perf = inputs[4]
+    scored = ~np.isnan(perf)
+    perf = perf[scored]
+    with np.errstate(all = 'ignore'):
+        edge = (ratings['off_elo'] - ratings['def_elo'])[:, scored]
+        edge_dev = edge - edge.mean(axis = 1, keepdims = True)
+        perf_dev = perf - perf.mean()
+        corr = (edge_dev @ perf_dev) / np.sqrt((edge_dev**2).sum(axis = 1) * (perf_dev**2).sum())
+    summary = grid.reset_index(drop = True).assign(
+        edge_corr = corr,
+        edge_accuracy = (np.sign(edge) == np.sign(perf)).mean(axis = 1)
+    )
 
+    return elo_df, ratings, summary
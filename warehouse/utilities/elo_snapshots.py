@@ -0,0 +1,237 @@
+"""
+Checkpointed ELO ratings that resume from the last week walked.
+
+calculate_elo_metric starts every entity at elo_base and replays all history. update_elo walks
+the same ratings but keeps the state after every (season, week) on disk: the entity keys of
+each side (one row per combination of lookup values, entity id = row, only ever appended to)
+and per week the rating of every entity id. Adding a week then loads the latest snapshot and
+walks only the new matchups.
+
+cache/elo/
+    rushing/
+        off_keys.parquet
+        def_keys.parquet
+        season=2021/week=01.npz
+        ...
+
+Example:
+
+# Full history once, then one week at a time, in the chain's own directory
+update_elo(rushing_off_epa, rushing_def_epa, f'{ELO_DIR}/rushing', from_snapshot = None)
+update_elo(new_week_off, new_week_def, f'{ELO_DIR}/rushing')
+
+"""
+import os
+import glob
+import re
+import numpy as np
+import pandas as pd
+from warehouse.utilities.elo import elo_matchups, kernel_inputs, run_elo_kernel, order_groups, \
+    ELO_PARAMS
+
+REPO_NAME = 'sewer-nfl'
+CWD = str(os.getcwd())
+REPO_DIR = CWD[:CWD.find(REPO_NAME)+len(REPO_NAME)]
+ELO_DIR = f'{REPO_DIR}/cache/elo'
+
+SIDES = ['off','def']
+
+def snapshot_path(directory, season, week):
+    return f'{directory}/season={season}/week={week:02d}.npz'
+
+def keys_path(directory, side):
+    return f'{directory}/{side}_keys.parquet'
+
+def snapshots(directory):
+    '''
+    (season, week) of every snapshot in directory, in order
+    '''
+    found = []
+    for path in glob.glob(f'{directory}/season=*/week=*.npz'):
+        season, week = re.search(
+            r'season=(\d+)/week=(\d+)\.npz$', path.replace(os.sep, '/')
+        ).groups()
+        found.append((int(season), int(week)))
+    return sorted(found)
+
+class EloState():
+    '''
+
+    Ratings after a (season, week): per side ('off' / 'def') a frame of entity keys and a
+    float64 rating array by entity id (NaN where an entity has no rating yet), with the ELO
+    parameters they were walked with
+
+    '''
+
+    def __init__(self, keys, ratings, params, season = None, week = None):
+
+        self.keys = keys
+        self.ratings = ratings
+        self.params = params
+        self.season = season
+        self.week = week
+
+    @classmethod
+    def load(cls, directory, season = None, week = None):
+        '''
+        Snapshot of (season, week) in directory, the latest one by default
+        '''
+        if season is None:
+            found = snapshots(directory)
+            if len(found) == 0:
+                raise FileNotFoundError(f'no ELO snapshots in {directory}')
+            season, week = found[-1]
+        with np.load(snapshot_path(directory, season, week)) as snapshot:
+            arrays = {k: snapshot[k] for k in snapshot.files}
+
+        keys = {
+            side: pd.read_parquet(keys_path(directory, side), engine = 'pyarrow') for side in SIDES
+        }
+        # Entities added after this snapshot have no rating in it
+        ratings = {
+            side: np.concatenate([
+                arrays[side],
+                np.full(len(keys[side]) - len(arrays[side]), np.nan)
+            ])
+            for side in SIDES
+        }
+        params = dict(zip(ELO_PARAMS, arrays['params'].tolist()))
+
+        return cls(keys, ratings, params, season, week)
+
+    @classmethod
+    def from_keys(cls, directory, params):
+        '''
+        State with the entity keys saved in directory and no ratings
+        '''
+        keys = {
+            side: pd.read_parquet(keys_path(directory, side), engine = 'pyarrow') for side in SIDES
+        }
+        ratings = {side: np.full(len(keys[side]), np.nan) for side in SIDES}
+        return cls(keys, ratings, params)
+
+    def entity_ids(self, data, side, lookup_values):
+        '''
+        Entity ids of the rows of data on one side, adding entities not seen before
+        '''
+        known = self.keys.get(side)
+        combined = data[lookup_values] if known is None else pd.concat(
+            [known, data[lookup_values]], ignore_index = True
+        )
+        # Group numbers follow first appearance, so known entities keep their ids
+        ids = combined.groupby(lookup_values, sort = False, dropna = False, observed = True)\
+            .ngroup().to_numpy()
+
+        n_known = 0 if known is None else len(known)
+        n = ids.max() + 1 if len(ids) else n_known
+        first = pd.Series(np.arange(len(ids))).groupby(ids).first().to_numpy()
+        self.keys[side] = combined.iloc[first].reset_index(drop = True)
+        self.ratings[side] = np.concatenate([
+            self.ratings.get(side, np.array([])),
+            np.full(n - n_known, np.nan)
+        ])
+
+        return ids[n_known:]
+
+    def save_keys(self, directory):
+        os.makedirs(directory, exist_ok = True)
+        for side in SIDES:
+            self.keys[side].to_parquet(
+                keys_path(directory, side), engine = 'pyarrow', index = False
+            )
+
+    def save(self, directory):
+        '''
+        Write the ratings as the snapshot of (self.season, self.week), the keys must be saved
+        '''
+        path = snapshot_path(directory, self.season, self.week)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        np.savez(
+            path,
+            params = np.array([self.params[p] for p in ELO_PARAMS], dtype = np.float64),
+            **self.ratings
+        )
+
+def drop_snapshots(directory, after = None):
+    '''
+    Remove the snapshots later than after ((season, week)), all of them when it is None
+    '''
+    for season, week in snapshots(directory):
+        if after is None or (season, week) > tuple(after):
+            os.remove(snapshot_path(directory, season, week))
+
+def update_elo(
+    new_week_off,
+    new_week_def,
+    snapshot_dir,
+    from_snapshot = 'latest',
+    order_cols = ['season','week'],
+    off_gb_cols = ['posteam','defteam','position','rusher_player_id','player_name'],
+    def_gb_cols = ['posteam','defteam','position'],
+    off_lookup_values = ['position','rusher_player_id'],
+    def_lookup_values = ['position','defteam'],
+    off_perf_col = 'z_epa_x',
+    def_perf_col = 'z_epa_y',
+    elo_multiplier = 3,
+    elo_power = 2,
+    elo_season_reset = 0.5,
+    elo_base = 2000
+):
+    '''
+    calculate_elo_metric for weeks after a snapshot, starting from its ratings, writing a
+    snapshot after every new week. snapshot_dir belongs to one chain (e.g. f'{ELO_DIR}/rushing'),
+    chains sharing a directory would mix their entity keys and snapshots. from_snapshot is
+    'latest' (a fresh walk when snapshot_dir has no snapshot yet), a (season, week) in
+    snapshot_dir (later snapshots are dropped, they no longer follow from it) or None to start
+    from elo_base. new_week_off / new_week_def are pre_elo_epa rows of the new weeks, computed
+    over at least their whole seasons so the appearance counts (season resets) are right.
+    Returns the rated matchups of the new weeks, equal to the tail of a full calculate_elo_metric
+    run
+    '''
+    params = dict(zip(ELO_PARAMS, [elo_multiplier, elo_power, elo_season_reset, elo_base]))
+    elo_df = elo_matchups(new_week_off, new_week_def, order_cols, off_gb_cols, def_gb_cols)
+
+    if from_snapshot == 'latest' and len(snapshots(snapshot_dir)) == 0:
+        from_snapshot = None
+    if from_snapshot is None:
+        # Keys are append-only, a fresh walk keeps their ids
+        state = EloState.from_keys(snapshot_dir, params) \
+            if os.path.exists(keys_path(snapshot_dir, 'off')) else EloState({}, {}, params)
+        drop_snapshots(snapshot_dir)
+    else:
+        state = EloState.load(snapshot_dir, *([] if from_snapshot == 'latest' else from_snapshot))
+        if state.params != {k: float(v) for k, v in params.items()}:
+            raise ValueError(f'snapshot was walked with {state.params}, not {params}')
+        walked = list(zip(elo_df['season'], elo_df['week']))
+        if walked and min(walked) <= (state.season, state.week):
+            raise ValueError(f'matchups start at {min(walked)}, '
+                f'not after the snapshot ({state.season}, {state.week})')
+        drop_snapshots(snapshot_dir, (state.season, state.week))
+
+    ids = [state.entity_ids(elo_df, 'off', off_lookup_values),
+           state.entity_ids(elo_df, 'def', def_lookup_values)]
+    state.save_keys(snapshot_dir)
+    inputs = ids + kernel_inputs(elo_df, off_lookup_values, def_lookup_values, off_perf_col,
+        def_perf_col)[2:]
+
+    # Rows are in order_cols order, walk one order_cols value at a time and snapshot after it
+    # under its last (season, week), a finer order keeping the last step of each week
+    outputs = [np.empty(len(elo_df)) for _ in range(4)]
+    season, week = elo_df['season'].to_numpy(), elo_df['week'].to_numpy()
+    for rows in order_groups(elo_df, order_cols).values():
+        start, stop = rows.min(), rows.max() + 1
+        *values, state.ratings['off'], state.ratings['def'] = run_elo_kernel(
+            [a[start:stop] for a in inputs],
+            state.ratings['off'],
+            state.ratings['def'],
+            *params.values()
+        )
+        for output, value in zip(outputs, values):
+            output[start:stop] = value
+        state.season, state.week = int(season[stop - 1]), int(week[stop - 1])
+        state.save(snapshot_dir)
+
+    for col, values in zip(['off_elo','def_elo','off_elo_next','def_elo_next'], outputs):
+        elo_df[col] = values
+
+    return elo_df
@@ -0,0 +1,314 @@
+"""
+Cache for warehouse feature functions, keyed on dataset fingerprints.
+
+A fingerprint is a short string standing for the content of a DataFrame. Frames loaded through
+setup.py get one derived from the per-partition hashes the store records at ingestion (see
+store.PartitionedStore.fingerprint), so looking one up is O(1) however many plays it holds.
+Frames nobody registered (derived frames, user built frames) are hashed once on first use.
+Outputs of cached functions are registered too, so feeding one into another cached function is
+also O(1). A registered fingerprint is only reused while a cheap probe of the frame (its layout,
+the identity of its column arrays and a sample of PROBE_ROWS rows) is unchanged, so replacing or
+editing columns in place forces a rehash. Edits touching none of the sampled rows go unnoticed:
+treat frames passed to cached functions as read-only.
+
+Cache keys are (function name, code version, fingerprints of the DataFrame arguments, the
+remaining arguments with defaults filled in). The code version hashes the source of the function's
+module and of every warehouse module it reaches through imports (helpers, MEASURES, rolling,
+schema.py, players.py, ...) and the Python / pandas / numpy versions (ENVIRONMENT), so editing
+any of them or upgrading a library invalidates its entries, on disk as well. Bump CACHE_VERSION
+for changes the sources do not show (data fixes outside the repo).
+
+Cached values are copied in and out of the in-process LRU, so a caller mutating a returned
+frame does not change what the next caller gets.
+
+Entries live in a bounded in-process LRU and, when a directory is given, in a diskcache store
+on disk (DataFrames as Parquet bytes) shared by every process and session using the same
+directory. The disk store evicts least recently used entries past size_limit bytes. The shared
+feature_cache persists to cache/features, so notebooks, build_training_dataset and the pe1
+pipeline reuse each other's features and a tweaked pipe is the only thing recomputed.
+
+Example:
+
+cache = FeatureCache(maxsize = 256, directory = FEATURE_CACHE_DIR)
+
+@cache.memoize()
+def get_feature(api_data, trailing_weeks = 5):
+    ...
+
+"""
+import io
+import os
+import hashlib
+import inspect
+import sys
+import types
+import weakref
+from collections import OrderedDict
+from functools import wraps
+import diskcache
+import numpy as np
+import pandas as pd
+
+REPO_NAME = 'sewer-nfl'
+CWD = str(os.getcwd())
+REPO_DIR = CWD[:CWD.find(REPO_NAME)+len(REPO_NAME)]
+FEATURE_CACHE_DIR = f'{REPO_DIR}/cache/features'
+
+CACHE_VERSION = 1
+
+# Library versions the cached outputs were computed with. The disk store is shared across
+# sessions and environments, and pandas / numpy upgrades do change results (merge row order,
+# float rounding)
+ENVIRONMENT = (sys.version_info[:2], pd.__version__, np.__version__)
+
+# id(frame) -> (weak reference, probe when registered, fingerprint)
+FINGERPRINTS = {}
+
+# Evenly spaced rows hashed by frame_probe
+PROBE_ROWS = 256
+
+MISSING = object()
+
+def hash_values(*values):
+    '''
+    Stable digest of a sequence of plain values (strings, numbers, lists of them)
+    '''
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+def hash_frame(data):
+    '''
+    Content hash of a DataFrame / Series: row hashes plus column names and dtypes
+    '''
+    rows = pd.util.hash_pandas_object(data, index = False).to_numpy()
+    layout = [(str(c), str(t)) for c, t in data.dtypes.items()] if isinstance(data, pd.DataFrame) \
+        else [(str(data.name), str(data.dtype))]
+    return hash_values(hashlib.sha1(rows.tobytes()).hexdigest(), layout)
+
+def frame_probe(data):
+    '''
+    Cheap check of a DataFrame / Series for in-place changes: shape, column names and dtypes, the
+    identity of its arrays and up to PROBE_ROWS evenly spaced rows of each
+    '''
+    step = max(len(data) // PROBE_ROWS, 1)
+    layout = [(str(c), str(t)) for c, t in data.dtypes.items()] if isinstance(data, pd.DataFrame) \
+        else [(str(data.name), str(data.dtype))]
+    digest = hashlib.sha1()
+    for block in data._mgr.blocks:
+        # 2D (columns x rows) for numpy blocks, 1D for extension arrays
+        sample = np.asarray(block.values[..., ::step])
+        digest.update(
+            sample.tobytes() if sample.dtype.kind in 'biufcmM' else repr(sample.tolist()).encode()
+        )
+    arrays = [id(block.values) for block in data._mgr.blocks]
+    return hash_values(data.shape, layout, arrays, digest.hexdigest())
+
+def register_fingerprint(data, fingerprint):
+    '''
+    Record the fingerprint of data for as long as the object is alive
+    '''
+    key = id(data)
+    ref = weakref.ref(data, lambda _, key = key: FINGERPRINTS.pop(key, None))
+    FINGERPRINTS[key] = (ref, frame_probe(data), fingerprint)
+    return data
+
+def fingerprint(data):
+    '''
+    Registered fingerprint of data, hashing (and registering) it when there is none. A frame
+    changed in place since registration (see frame_probe) is rehashed
+    '''
+    entry = FINGERPRINTS.get(id(data))
+    if entry is not None and entry[0]() is data and entry[1] == frame_probe(data):
+        return entry[2]
+    fp = hash_frame(data)
+    register_fingerprint(data, fp)
+    return fp
+
+def module_version(module):
+    '''
+    Hash of a module's source
+    '''
+    return hash_values(inspect.getsource(module))
+
+def dependency_modules(module, package = None, seen = None):
+    '''
+    module and every module of its top level package it reaches through its globals (imported
+    modules, functions and classes), transitively
+    '''
+    package = module.__name__.split('.')[0] if package is None else package
+    seen = {} if seen is None else seen
+    seen[module.__name__] = module
+
+    for value in vars(module).values():
+        name = value.__name__ if isinstance(value, types.ModuleType) \
+            else getattr(value, '__module__', None)
+        if not isinstance(name, str) or name.split('.')[0] != package or name in seen:
+            continue
+        dependency = sys.modules.get(name)
+        if dependency is not None:
+            dependency_modules(dependency, package, seen)
+
+    return seen
+
+def code_version(func):
+    '''
+    Hash of func's source, the source of the modules it depends on, CACHE_VERSION and
+    ENVIRONMENT
+    '''
+    modules = dependency_modules(sys.modules[func.__module__])
+    return hash_values(
+        inspect.getsource(func),
+        [(name, module_version(modules[name])) for name in sorted(modules)],
+        CACHE_VERSION,
+        ENVIRONMENT
+    )
+
+def copied(value):
+    '''
+    Copy of DataFrames / Series (alone or in a tuple), anything else as is
+    '''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(copied(v) for v in value)
+    return value
+
+def key_value(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return ('frame', fingerprint(value))
+    return repr(value)
+
+def encode(value):
+    '''
+    DataFrames (alone or in a tuple) as Parquet bytes, anything else is left to diskcache (pickle)
+    '''
+    if isinstance(value, pd.DataFrame):
+        buffer = io.BytesIO()
+        value.to_parquet(buffer, engine = 'pyarrow')
+        return ('parquet', buffer.getvalue())
+    if isinstance(value, tuple) and all(isinstance(v, pd.DataFrame) for v in value):
+        return ('tuple', tuple(encode(v) for v in value))
+    return ('object', value)
+
+def decode(stored):
+    kind, value = stored
+    if kind == 'parquet':
+        return pd.read_parquet(io.BytesIO(value), engine = 'pyarrow')
+    if kind == 'tuple':
+        return tuple(decode(v) for v in value)
+    return value
+
+class FeatureCache():
+    '''
+
+    Bounded LRU cache of feature function outputs, backed by an on-disk store when directory
+    is set
+
+    '''
+
+    def __init__(self, maxsize = 256, directory = None, size_limit = 2**30):
+
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.directory = directory
+        self.size_limit = size_limit
+        self._disk = None
+
+    @property
+    def disk(self):
+        '''
+        diskcache store, opened on first use (None when the cache is memory only)
+        '''
+        if self._disk is None and self.directory is not None:
+            self._disk = diskcache.Cache(
+                self.directory,
+                size_limit = self.size_limit,
+                eviction_policy = 'least-recently-used'
+            )
+        return self._disk
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default = None):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return copied(self.entries[key])
+        stored = self.disk.get(key, MISSING) if self.disk is not None else MISSING
+        if stored is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        value = decode(stored)
+        self.remember(key, value)
+        return value
+
+    def remember(self, key, value):
+        '''
+        Add (a copy of) value to the in-process LRU only
+        '''
+        self.entries[key] = copied(value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last = False)
+
+    def set(self, key, value):
+        self.remember(key, value)
+        if self.disk is not None:
+            self.disk.set(key, encode(value))
+
+    def clear(self, disk = False):
+        '''
+        Empty the in-process LRU, and the on-disk store when disk = True
+        '''
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        if disk and self.disk is not None:
+            self.disk.clear()
+
+    def memoize(self):
+        '''
+        Decorator caching func on its arguments, DataFrames by fingerprint. The uncached function
+        is available as <function>.uncached and the key for a call from <function>.cache_key
+        '''
+        def decorator(func):
+            signature = inspect.signature(func)
+            name = f'{func.__module__}.{func.__qualname__}'
+            # Worked out on the first call, once every module func depends on is imported
+            version = []
+
+            def cache_key(*args, **kwargs):
+                if not version:
+                    version.append(code_version(func))
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = tuple((k, key_value(v)) for k, v in bound.arguments.items())
+                return hash_values(name, version[0], arguments)
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = cache_key(*args, **kwargs)
+                result = self.get(key, MISSING)
+                if result is MISSING:
+                    result = func(*args, **kwargs)
+                    self.set(key, result)
+                if isinstance(result, (pd.DataFrame, pd.Series)):
+                    register_fingerprint(result, key)
+                return result
+
+            wrapper.uncached = func
+            wrapper.cache = self
+            wrapper.cache_key = cache_key
+            return wrapper
+
+        return decorator
+
+# Shared by the warehouse pipelines
+feature_cache = FeatureCache(directory = FEATURE_CACHE_DIR)
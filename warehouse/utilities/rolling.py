@@ -0,0 +1,219 @@
+"""
+Trailing window kernel for team-week feature matrices.
+
+Equivalent to data.groupby(group_cols)[columns].rolling(n).mean() / .sum() (min_periods = n,
+so a window with fewer than n rows or any NaN / +-inf is NaN) for data already sorted by group_cols and
+week, computed for every column at once from cumulative sums: the window ending at row i is
+sums[i] - sums[i - n], masked where it would cross into the previous group.
+
+Passing a HalfLife instead of a window size switches to an exponentially weighted mode: the
+per-(season, team) recurrence
+
+    mean: state = decay * state + (1 - decay) * value     sum: state = decay * state + value
+
+with decay = 0.5 ** (1 / half_life), started from the group's first value, NaN values leaving the
+state unchanged (pandas ewm(adjust = False, ignore_na = True)). It is defined from a team's first
+week and only needs last week's state to produce the next one: ewma_update advances state a caller
+keeps (the last row of each team) by one week. The catalog keeps no such state, so HalfLife
+features are recomputed over the season there (ewma_window), incremental updates included.
+
+Passing Weekly() returns the per-week values as they are. A function built on rolling_window then
+yields its un-rolled values, which rolling_windows turns into any number of trailing windows from
+one PrefixSums (see catalog.run_feature).
+
+Example:
+
+rolled = rolling_window(team_weeks, ['epa','yards'], 5, group_cols = ['season','team'])
+smoothed = rolling_window(team_weeks, ['epa','yards'], HalfLife(3), group_cols = ['season','team'])
+
+"""
+import numpy as np
+import pandas as pd
+
+def group_starts(data, group_cols):
+    '''
+    Position of the first row of each row's group, groups being runs of equal group_cols values
+    '''
+    n_rows = len(data)
+    new_group = np.zeros(n_rows, dtype = bool)
+    if n_rows > 0:
+        new_group[0] = True
+    for col in group_cols:
+        values = data[col].to_numpy()
+        new_group[1:] |= values[1:] != values[:-1]
+
+    return np.maximum.accumulate(np.where(new_group, np.arange(n_rows), 0))
+
+class PrefixSums():
+    '''
+
+    Cumulative sums (and non-NaN counts) of a rows x features matrix, from which any trailing
+    window can be read in O(rows x features)
+
+    Example:
+
+    prefix = PrefixSums(team_weeks, ['epa','yards'], group_cols = ['season','team'])
+    five_week, ten_week = prefix.window(5), prefix.window(10)
+
+    '''
+
+    def __init__(self, data, columns, group_cols = ['season','team']):
+
+        self.index = data.index
+        self.columns = columns
+        self.starts = group_starts(data, group_cols)
+
+        values = data[columns].to_numpy(dtype = np.float64)
+        # +-inf counts as missing, as in pandas rolling, and must stay out of the running sums
+        valid = np.isfinite(values)
+        # Leading row of zeros so the window ending at row i is sums[i+1] - sums[i+1-n]
+        self.sums = np.vstack([
+            np.zeros((1, len(columns))),
+            np.cumsum(np.where(valid, values, 0), axis = 0)
+        ])
+        self.counts = np.vstack([
+            np.zeros((1, len(columns)), dtype = np.int64),
+            np.cumsum(valid, axis = 0)
+        ])
+
+    def window(self, n, how = 'mean'):
+        '''
+        Trailing n row sum or mean ending at every row, as a DataFrame aligned with data
+        '''
+        rows = np.arange(len(self.starts))
+        lower = np.maximum(rows + 1 - n, 0)
+
+        total = self.sums[rows + 1] - self.sums[lower]
+        observed = self.counts[rows + 1] - self.counts[lower]
+
+        # Full window inside the group, with every value present
+        complete = ((rows + 1 - n) >= self.starts)[:, None] & (observed == n)
+        result = total / n if how == 'mean' else total
+
+        return pd.DataFrame(
+            np.where(complete, result, np.nan),
+            index = self.index,
+            columns = self.columns
+        )
+
+class HalfLife():
+    '''
+
+    Exponentially weighted trailing mode, accepted anywhere a trailing window size is
+    (Configuration(trailing_weeks = HalfLife(3)), the catalog functions, rolling_window)
+
+    '''
+
+    def __init__(self, weeks):
+
+        self.weeks = weeks
+        self.decay = 0.5 ** (1 / weeks)
+
+    def __repr__(self):
+        return f'HalfLife({self.weeks})'
+
+    def __eq__(self, other):
+        return isinstance(other, HalfLife) and other.weeks == self.weeks
+
+    def __hash__(self):
+        return hash(('HalfLife', self.weeks))
+
+class Weekly():
+    '''
+
+    No trailing window: rolling_window returns the per-week values unchanged
+
+    '''
+
+    def __repr__(self):
+        return 'Weekly()'
+
+    def __eq__(self, other):
+        return isinstance(other, Weekly)
+
+    def __hash__(self):
+        return hash('Weekly')
+
+def warmup_weeks(trailing_weeks):
+    '''
+    Weeks before a trailing feature is defined: the window size, none for a HalfLife or Weekly
+    '''
+    return 0 if isinstance(trailing_weeks, (HalfLife, Weekly)) else trailing_weeks
+
+def ewma_step(state, values, decay, how = 'mean'):
+    '''
+    One week of the exponentially weighted recurrence for many groups at once. state is NaN for
+    groups with no history yet
+    '''
+    weight = 1 - decay if how == 'mean' else 1
+    updated = np.where(np.isnan(state), values, decay * state + weight * values)
+    return np.where(np.isnan(values), state, updated)
+
+def ewma_window(data, columns, half_life, how = 'mean', group_cols = ['season','team']):
+    '''
+    Exponentially weighted mean / sum of columns (a list of names) within group_cols, data sorted
+    by group_cols then week. Steps through the k-th week of every group together, so the loop
+    runs once per week of a season rather than once per row
+    '''
+    position = np.arange(len(data)) - group_starts(data, group_cols)
+    values = data[columns].to_numpy(dtype = np.float64)
+    result = np.full(values.shape, np.nan)
+
+    for k in range(position.max() + 1 if len(data) > 0 else 0):
+        rows = np.flatnonzero(position == k)
+        state = result[rows - 1] if k > 0 else np.full((len(rows), len(columns)), np.nan)
+        result[rows] = ewma_step(state, values[rows], half_life.decay, how)
+
+    return pd.DataFrame(result, index = data.index, columns = columns)
+
+def ewma_update(previous, week, columns, half_life, how = 'mean', group_cols = ['season','team']):
+    '''
+    Next week of an exponentially weighted feature. previous holds group_cols and the latest
+    trailing value of columns for each group (e.g. the last row of each team so far), week the new
+    week's raw values. Returns week with columns replaced by their trailing values; groups new in
+    week start from their raw value
+    '''
+    state = week[group_cols].merge(previous[group_cols + columns], how = 'left', on = group_cols)
+    updated = ewma_step(
+        state[columns].to_numpy(dtype = np.float64),
+        week[columns].to_numpy(dtype = np.float64),
+        half_life.decay,
+        how
+    )
+    return week.assign(**{c: updated[:, i] for i, c in enumerate(columns)})
+
+def rolling_window(data, columns, trailing_weeks = 5, how = 'mean', group_cols = ['season','team']):
+    '''
+    Trailing sum / mean of columns (a name or list of names) within group_cols, data sorted by
+    group_cols then week, over trailing_weeks rows or exponentially weighted for a HalfLife.
+    Returns a Series for a single name, otherwise a DataFrame
+    '''
+    names = [columns] if isinstance(columns, str) else list(columns)
+    if isinstance(trailing_weeks, Weekly):
+        result = data[names]
+    elif isinstance(trailing_weeks, HalfLife):
+        result = ewma_window(data, names, trailing_weeks, how, group_cols)
+    else:
+        result = PrefixSums(data, names, group_cols).window(trailing_weeks, how)
+
+    return result[columns]
+
+def rolling_windows(data, columns, windows, how = 'mean', group_cols = ['season','team']):
+    '''
+    rolling_window of columns (a list of names) for every window size / HalfLife / Weekly in
+    windows, as a list of DataFrames. The window sizes share one PrefixSums
+    '''
+    prefix = None
+    results = []
+    for trailing_weeks in windows:
+        if isinstance(trailing_weeks, Weekly):
+            results.append(data[columns])
+            continue
+        if isinstance(trailing_weeks, HalfLife):
+            results.append(ewma_window(data, columns, trailing_weeks, how, group_cols))
+            continue
+        if prefix is None:
+            prefix = PrefixSums(data, columns, group_cols)
+        results.append(prefix.window(trailing_weeks, how))
+
+    return results
@@ -0,0 +1,196 @@
+"""
+Dense season x week x team x feature store for team-week features.
+
+Features that are usually long DataFrames keyed on ['season','week','team'] are held as one
+float64 array of shape (season, week, team, feature), with fixed season / week / team axes and
+NaN where a team has no row (bye weeks, features that start later). A second boolean array
+records which cells had a row at all, since a row can be present with a NaN value (the warm-up
+of a trailing window) and joins keep those rows.
+
+Joining features is then indexing into the same array instead of hash merges, and moving every
+feature one week later (the week - 1 pairing that keeps a game's own result out of its features)
+is a slice of the week axis.
+
+Example:
+
+tensor = TeamWeekTensor.from_frames([get_pct_pass(api_data), get_off_epa(api_data)])
+tensor.to_frame(how = 'inner')
+tensor.shifted(1).gather(games['season'], games['week'], games['home_team'])
+
+"""
+import numpy as np
+import pandas as pd
+from warehouse.utilities.rolling import rolling_window
+
+KEY_COLUMNS = ['season','week','team']
+
+# Team key of a long feature frame, the first of these it has
+TEAM_COLUMNS = ['team','defteam','posteam']
+
+def team_column(data):
+    return next(c for c in TEAM_COLUMNS if c in data.columns)
+
+def feature_columns(data):
+    return [c for c in data.columns if c not in ['season','week'] + TEAM_COLUMNS]
+
+class TeamWeekTensor():
+    '''
+
+    Team-week features as values[season, week, team, feature] (NaN where missing) and
+    present[season, week, team, feature] (True where the feature had a row). The week axis is
+    every week from the first to the last, so shifting by k weeks is shifting by k positions
+
+    '''
+
+    def __init__(self, seasons, weeks, teams, key_dtypes = None):
+
+        self.seasons = pd.Index(sorted(seasons))
+        self.weeks = np.arange(min(weeks), max(weeks) + 1)
+        self.teams = pd.Index(sorted(teams))
+        self.features = []
+
+        # dtypes of season / week / team in the frames, restored on export
+        self.key_dtypes = key_dtypes
+
+        shape = (len(self.seasons), len(self.weeks), len(self.teams), 0)
+        self.values = np.full(shape, np.nan)
+        self.present = np.zeros(shape, dtype = bool)
+
+    @classmethod
+    def from_frames(cls, frames):
+        '''
+        Tensor spanning every season, week and team in the long frames, with their value columns
+        as features in order
+        '''
+        seasons = set().union(*[f['season'].unique() for f in frames])
+        weeks = set().union(*[f['week'].unique() for f in frames])
+        teams = set().union(*[f[team_column(f)].dropna().unique() for f in frames])
+
+        first = frames[0]
+        key_dtypes = {
+            'season': first['season'].dtype,
+            'week': first['week'].dtype,
+            'team': first[team_column(first)].dtype
+        }
+        tensor = cls(seasons, weeks, teams, key_dtypes)
+        for frame in frames:
+            tensor.add(frame)
+
+        return tensor
+
+    def locate(self, season, week, team):
+        '''
+        Season, week and team positions of key arrays, -1 where a key is outside the axes
+        '''
+        s = self.seasons.get_indexer(np.asarray(season))
+        w = np.asarray(week, dtype = np.int64) - self.weeks[0]
+        w = np.where((w >= 0) & (w < len(self.weeks)), w, -1)
+        t = self.teams.get_indexer(np.asarray(team, dtype = object))
+        return s, w, t
+
+    def add(self, frame, columns = None):
+        '''
+        Append value columns (all non-key columns by default) of a long frame keyed on season,
+        week and team (or defteam / posteam) as features. Rows outside the axes are ignored, a
+        key appearing twice raises a ValueError (aggregate the frame first)
+        '''
+        columns = feature_columns(frame) if columns is None else columns
+        s, w, t = self.locate(frame['season'], frame['week'], frame[team_column(frame)])
+        found = (s >= 0) & (w >= 0) & (t >= 0)
+
+        cells = np.ravel_multi_index((s[found], w[found], t[found]), self.values.shape[:3])
+        unique, counts = np.unique(cells, return_counts = True)
+        if (counts > 1).any():
+            duplicated = np.unravel_index(unique[counts > 1][:5], self.values.shape[:3])
+            keys = list(zip(
+                self.seasons[duplicated[0]], self.weeks[duplicated[1]], self.teams[duplicated[2]]
+            ))
+            raise ValueError(f'{(counts > 1).sum()} (season, week, team) keys of {list(columns)} '
+                             f'appear more than once, e.g. {keys}')
+
+        shape = self.values.shape[:3] + (len(columns),)
+        values = np.full(shape, np.nan)
+        present = np.zeros(shape, dtype = bool)
+        values[s[found], w[found], t[found]] = frame[columns].to_numpy(dtype = np.float64)[found]
+        present[s[found], w[found], t[found]] = True
+
+        self.values = np.concatenate([self.values, values], axis = 3)
+        self.present = np.concatenate([self.present, present], axis = 3)
+        self.features += list(columns)
+
+        return self
+
+    def feature_index(self, features = None):
+        features = self.features if features is None else features
+        return [self.features.index(f) for f in features]
+
+    def gather(self, season, week, team, features = None):
+        '''
+        Values (rows x features) and presence at key arrays, NaN / False where there is no cell
+        '''
+        idx = self.feature_index(features)
+        s, w, t = self.locate(season, week, team)
+        found = (s >= 0) & (w >= 0) & (t >= 0)
+
+        values = np.full((len(s), len(idx)), np.nan)
+        present = np.zeros((len(s), len(idx)), dtype = bool)
+        values[found] = self.values[s[found], w[found], t[found]][:, idx]
+        present[found] = self.present[s[found], w[found], t[found]][:, idx]
+
+        return values, present
+
+    def shifted(self, weeks = 1):
+        '''
+        Copy with every feature moved `weeks` later, so week w holds what week w - weeks had
+        '''
+        shifted = TeamWeekTensor(self.seasons, self.weeks, self.teams, self.key_dtypes)
+        shifted.features = list(self.features)
+        shifted.values = np.full_like(self.values, np.nan)
+        shifted.present = np.zeros_like(self.present)
+        shifted.values[:, weeks:] = self.values[:, :len(self.weeks) - weeks]
+        shifted.present[:, weeks:] = self.present[:, :len(self.weeks) - weeks]
+
+        return shifted
+
+    def to_frame(self, features = None, how = 'left'):
+        '''
+        Long season / week / team / features frame sorted by season, team, week. Rows are the
+        team-weeks where the first feature is present (how = 'left'), where all are ('inner') or
+        where any is ('outer'), matching the joins of the long frames
+        '''
+        idx = self.feature_index(features)
+        present = self.present[..., idx]
+        rows = {
+            'left': present[..., 0],
+            'inner': present.all(axis = 3),
+            'outer': present.any(axis = 3)
+        }[how]
+
+        # (season, team, week) order, the order trailing windows run in
+        s, t, w = np.nonzero(rows.transpose(0, 2, 1))
+        keys = {
+            'season': self.seasons[s],
+            'week': self.weeks[w],
+            'team': self.teams[t]
+        }
+        frame = pd.DataFrame({
+            k: pd.Series(v).astype(self.key_dtypes[k]) if self.key_dtypes else v
+            for k, v in keys.items()
+        })
+        values = self.values[s, w, t][:, idx]
+        for i, feature in enumerate(self.features[j] for j in idx):
+            frame[feature] = values[:, i]
+
+        return frame
+
+    def rolling(self, feature, trailing_weeks = 5, how = 'mean', name = None):
+        '''
+        Add the trailing window of a feature along the week axis, over the weeks it is present
+        (byes are skipped, as in rolling_window), as feature name (feature_<trailing_weeks> by
+        default)
+        '''
+        name = f'{feature}_{trailing_weeks}' if name is None else name
+        frame = self.to_frame([feature])
+        frame[name] = rolling_window(frame, feature, trailing_weeks, how, group_cols = ['season','team'])
+
+        return self.add(frame, [name])